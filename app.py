@@ -1,6 +1,9 @@
 import streamlit as st
+import os
 import time
-from src.generator import FewShotGenerator
+import threading
+from src.warmup import BackgroundLoader
+from src.scheduler import MicroBatchScheduler, QueueFullError
 
 # Page Config with a cute title icon
 st.set_page_config(page_title="Sym Train AI", page_icon="🤖", layout="wide")
@@ -38,10 +41,37 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize the logic engine
+# Initialize the logic engine in the background so the page renders right away
+# (heavy imports and model loading happen on the loader thread)
+def build_generator():
+    from src.generator import FewShotGenerator
+    from src.metrics import sinks_from_env, profiler_from_env
+    from src.result_cache import result_cache_from_env
+    # Metrics export, the slow-request profiler and the result cache are configured via SYMTRAIN_* env vars
+    return FewShotGenerator(metrics_sinks=sinks_from_env(), profiler=profiler_from_env(),
+                            result_cache=result_cache_from_env())
+
+@st.cache_resource
+def get_loader():
+    return BackgroundLoader(build_generator).start()
+
+loader = get_loader()
+
+# Stream the category, summary and steps as they are produced (SYMTRAIN_STREAMING=0 uses the
+# micro-batching scheduler instead: higher throughput with many users, but nothing shows until the end)
+STREAMING = os.environ.get("SYMTRAIN_STREAMING", "1") != "0"
+# Streams run one request each, so cap how many run at once (SYMTRAIN_MAX_STREAMS)
+MAX_STREAMS = int(os.environ.get("SYMTRAIN_MAX_STREAMS", "4"))
+STREAM_WAIT_S = 30
+
+@st.cache_resource
+def get_stream_slots():
+    return threading.BoundedSemaphore(MAX_STREAMS)
+
+# One scheduler per server: concurrent sessions are coalesced into batched forward passes
 @st.cache_resource
-def get_generator():
-    return FewShotGenerator()
+def get_scheduler():
+    return MicroBatchScheduler(loader.get()).start()
 
 # --- HEADER SECTION ---
 st.title("🤖 Sym Train Simulation Intelligence")
@@ -99,13 +129,14 @@ with st.sidebar:
 # --- MAIN INPUT ---
 st.subheader("How can I help you today?")
 
-# Load models with a spinner
-try:
-    with st.spinner("Wakeing up the AI Brain... "):
-        generator = get_generator()
+# Readiness state of the background loader
+status = loader.status()
+if status["state"] == "ready":
     st.caption(" Local Models Ready")
-except Exception as e:
-    st.error(f"Error loading models: {e}")
+elif status["state"] == "failed":
+    st.error(f"Error loading models: {status['error']}")
+else:
+    st.caption(f" Waking up the AI Brain in the background... ({status['elapsed_s']}s)")
 
 user_input = st.text_area("Paste a customer transcript here:", height=100)
 
@@ -113,30 +144,112 @@ if st.button(" Generate Plan ", type="primary"):
     if not user_input:
         st.warning("Please tell me what the customer wants first!")
     else:
-        with st.spinner("Reading transcript & thinking..."):
-            # Call the generator
-            result = generator.generate_steps(user_input)
-            
-            # --- RESULTS SECTION ---
+        try:
+            with st.spinner("Still waking up the AI Brain... "):
+                generator = loader.get()
+                scheduler = None if STREAMING else get_scheduler()
+        except Exception as e:
+            st.error(f"Error loading models: {e}")
+            st.stop()
+
+        if STREAMING:
+            slots = get_stream_slots()
+            with st.spinner("Waiting for a free slot..."):
+                if not slots.acquire(timeout=STREAM_WAIT_S):
+                    st.warning("The assistant is busy right now, please try again in a moment.")
+                    st.stop()
+
+            # --- RESULTS SECTION (filled in live as the pipeline streams) ---
             st.markdown("---")
             col_res_1, col_res_2 = st.columns([2, 1])
-            
+
             with col_res_1:
-                st.subheader(f" Category: {result.get('category', 'Unknown')}")
-                st.info(f"**Reasoning:** {result.get('reason', 'N/A')}")
-                
+                category_slot = st.empty()
+                reason_slot = st.empty()
                 st.write("### Suggested Steps")
-                steps = result.get('steps', [])
-                if steps:
-                    for i, step in enumerate(steps):
-                        st.markdown(f"**{i+1}.** {step}")
-                else:
-                    st.write("No steps found.")
-
+                # A container inside an empty slot, so the streamed steps can be cleared
+                steps_slot = st.empty()
+                steps_area = steps_slot.container()
+                draft_slot = st.empty()
             with col_res_2:
+                json_slot = st.container()
+
+            category_slot.subheader(" Category: ...")
+            draft = ""
+            result, timings = {}, {}
+            try:
+                with st.spinner("Reading transcript & thinking..."):
+                    for event in generator.generate_steps_stream(user_input, include_timings=True):
+                        if event["type"] == "category":
+                            category_slot.subheader(f" Category: {event['category']}")
+                        elif event["type"] == "token":
+                            draft += event["text"]
+                            draft_slot.caption(draft + "▌")
+                        elif event["type"] == "step":
+                            steps_area.markdown(f"**{event['index']+1}.** {event['step']}")
+                        elif event["type"] == "error":
+                            # The summarizer failed mid-stream: drop what was shown, fallback steps follow
+                            draft = ""
+                            steps_slot.empty()
+                            steps_area = steps_slot.container()
+                        elif event["type"] == "result":
+                            result = event["result"]
+            finally:
+                slots.release()
+            draft_slot.empty()
+            timings = result.pop("timings", {})
+            reason_slot.info(f"**Reasoning:** {result.get('reason', 'N/A')}")
+            if not result.get('steps'):
+                steps_area.write("No steps found.")
+
+            with json_slot:
                 st.subheader(" System JSON")
                 st.caption("Backend Output Format")
                 st.json(result)
 
+                with st.expander(" Timings"):
+                    for stage, seconds in timings.get("stages_s", {}).items():
+                        st.caption(f"{stage}: {seconds * 1000:.0f} ms")
+                    st.json(timings)
+
+        else:
+            with st.spinner("Reading transcript & thinking..."):
+                # Call the generator (batched with other users' requests)
+                try:
+                    result = scheduler.submit(user_input, include_timings=True)
+                except QueueFullError:
+                    st.warning("The assistant is busy right now, please try again in a moment.")
+                    st.stop()
+                except TimeoutError:
+                    st.error("The request took too long, please try again.")
+                    st.stop()
+                timings = result.pop("timings", {})
+            
+                # --- RESULTS SECTION ---
+                st.markdown("---")
+                col_res_1, col_res_2 = st.columns([2, 1])
+            
+                with col_res_1:
+                    st.subheader(f" Category: {result.get('category', 'Unknown')}")
+                    st.info(f"**Reasoning:** {result.get('reason', 'N/A')}")
+                
+                    st.write("### Suggested Steps")
+                    steps = result.get('steps', [])
+                    if steps:
+                        for i, step in enumerate(steps):
+                            st.markdown(f"**{i+1}.** {step}")
+                    else:
+                        st.write("No steps found.")
+
+                with col_res_2:
+                    st.subheader(" System JSON")
+                    st.caption("Backend Output Format")
+                    st.json(result)
+
+                    with st.expander(" Timings"):
+                        for stage, seconds in timings.get("stages_s", {}).items():
+                            st.caption(f"{stage}: {seconds * 1000:.0f} ms")
+                        st.json(timings)
+
 st.markdown("---")
 st.caption("Sym Train Project | 100% Local Privacy Preserving AI")
\ No newline at end of file
@@ -1,55 +1,96 @@
 # Final src/analysis.py
 import os
 import json
-import pandas as pd
-# Suppress TensorFlow logs to keep output clean
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3' 
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
-
-from transformers import pipeline
-from openai import OpenAI
+import asyncio
 from typing import List, Dict
+from src.batching import run_batched, DEFAULT_BATCH_SIZE
+from src.models import get_classifier, get_summarizer, model_id, SUMMARIZER_MODEL, CATEGORIES, SUMMARY_PARAMS
+from src.summary_cache import SummaryCache, cached_summarize
+from src.long_summary import MapReduceSummarizer, SUMMARY_MODES, DEFAULT_CHUNK_TOKENS
+from src.knowledge_base import load_knowledge_base
+from src.fast_classifier import IntentClassifier, DistilledClassifier, DEFAULT_THRESHOLD
+from src.gpt_client import AsyncChatClient, analysis_prompt, gpt_response_cache, GPT_MODEL, DEFAULT_CONCURRENCY
 
 class AnalysisEngine:
-    def __init__(self):
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, classification_mode: str = "mnli",
+                 confidence_threshold: float = DEFAULT_THRESHOLD,
+                 distilled_path: str = "data/processed/fast_classifier.pkl",
+                 summary_mode: str = "window", chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+                 gpt_cache_path: str = "data/processed/gpt_cache.sqlite"):
+        if summary_mode not in SUMMARY_MODES:
+            raise ValueError(f"Unknown summary mode: {summary_mode} (expected one of {SUMMARY_MODES})")
         print("Loading Local Models...")
-        self.classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
-        self.summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-        self.candidate_labels = ["Insurance Claim", "Payment Update", "Order Status", "Flight Booking", "General Inquiry"]
+        self.batch_size = batch_size
+        self.summary_mode = summary_mode
+        self.chunk_tokens = chunk_tokens
+        # Chunk summaries only (map_reduce mode); kept in memory
+        self.summary_cache = SummaryCache()
+        # GPT answers keyed by endpoint and prompt hash (survives restarts)
+        self.gpt_cache = gpt_response_cache(gpt_cache_path)
+        self._openai_clients = {}
+        self._gpt_clients = {}
+        # Shared with FewShotGenerator through the process-wide model registry
+        get_classifier()
+        get_summarizer()
+        self.candidate_labels = list(CATEGORIES)
+        distilled = DistilledClassifier.load(distilled_path, self.candidate_labels) if classification_mode != "mnli" else None
+        self.intent = IntentClassifier(self.candidate_labels, classification_mode, confidence_threshold, distilled, batch_size)
+
+    @property
+    def classifier(self):
+        return get_classifier()
+
+    @property
+    def summarizer(self):
+        return get_summarizer()
 
     def analyze_local(self, text: str) -> Dict:
         """Run Local Transformer Analysis"""
+        return self.analyze_local_batch([text])[0]
+
+    def analyze_local_batch(self, texts: List[str], batch_size: int = None) -> List[Dict]:
+        """Run Local Transformer Analysis over length-bucketed batches (results in input order)"""
+        batch_size = batch_size or self.batch_size
+        inputs = [text[:1024] for text in texts]
+
         # 1. Categorize
-        cat_result = self.classifier(text[:1024], candidate_labels=self.candidate_labels)
+        cat_results = self.intent.classify_batch(inputs, batch_size)
         
-        # 2. Summarize steps
-        try:
-            summary = self.summarizer(text[:1024], max_length=150, min_length=40, do_sample=False)
-            steps_text = summary[0]['summary_text']
-        except:
-            steps_text = "Error in summarization."
-            
-        return {
-            "category": cat_result['labels'][0], 
-            "confidence": cat_result['scores'][0], 
-            "steps": steps_text
-        }
+        # 2. Summarize steps (whole transcript in map_reduce mode)
+        if self.summary_mode == "map_reduce":
+            summaries = MapReduceSummarizer(
+                lambda chunks: cached_summarize(self.summarizer, chunks, self.summary_cache, model_id(SUMMARIZER_MODEL),
+                                                SUMMARY_PARAMS, batch_size),
+                self.summarizer.tokenizer, self.chunk_tokens
+            ).summarize(texts)
+        else:
+            summaries = run_batched(
+                lambda batch: self.summarizer(batch, batch_size=len(batch), **SUMMARY_PARAMS),
+                inputs, batch_size
+            )
+            summaries = [s if isinstance(s, Exception) else s['summary_text'] for s in summaries]
+
+        results = []
+        for cat_result, summary in zip(cat_results, summaries):
+            steps_text = "Error in summarization." if isinstance(summary, Exception) else summary
+            results.append({
+                "category": cat_result['category'], 
+                "confidence": cat_result['confidence'], 
+                "steps": steps_text
+            })
+        return results
 
     def analyze_gpt(self, text: str, api_key: str) -> Dict:
         """Run GPT-4o Analysis"""
-        client = OpenAI(api_key=api_key)
-        prompt = f"""
-        Analyze this customer service transcript:
-        "{text[:2000]}"
-        
-        1. Categorize into one of: {self.candidate_labels}
-        2. Extract the exact steps taken by the agent.
-        
-        Return JSON: {{ "category": "...", "steps": ["step1", "step2"] }}
-        """
+        # One pooled client per key instead of a new connection per call
+        client = self._openai_clients.get(api_key)
+        if client is None:
+            from openai import OpenAI
+            client = self._openai_clients[api_key] = OpenAI(api_key=api_key)
+        prompt = analysis_prompt(text, self.candidate_labels)
         try:
             response = client.chat.completions.create(
-                model="gpt-4o-mini", 
+                model=GPT_MODEL, 
                 messages=[{"role": "user", "content": prompt}], 
                 response_format={"type": "json_object"}
             )
@@ -57,6 +98,26 @@ class AnalysisEngine:
         except Exception as e:
             return {"error": str(e)}
 
+    async def analyze_gpt_many(self, texts: List[str], api_key: str, base_url: str = None,
+                               max_concurrency: int = DEFAULT_CONCURRENCY, requests_per_minute: float = None,
+                               tokens_per_minute: float = None) -> List[Dict]:
+        """
+        Run GPT Analysis for many transcripts concurrently (results in input order).
+        Requests share one pooled client, are rate limited and retried with
+        exponential backoff; answers are cached on disk by prompt hash.
+        base_url points the client at another endpoint (e.g. src.mock_openai).
+        One client is kept per endpoint and limit settings.
+        """
+        key = (api_key, base_url, max_concurrency, requests_per_minute, tokens_per_minute)
+        client = self._gpt_clients.get(key)
+        if client is None:
+            client = self._gpt_clients[key] = AsyncChatClient(
+                api_key, base_url=base_url, max_concurrency=max_concurrency,
+                requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute,
+                cache=self.gpt_cache
+            )
+        return await client.complete_json_many([analysis_prompt(text, self.candidate_labels) for text in texts])
+
 def run_comparison():
     data_path = "data/processed/knowledge_base.csv"
     if not os.path.exists(data_path):
@@ -69,7 +130,7 @@ def run_comparison():
     print("If you don't have one, just press ENTER to see only the Local results.")
     api_key = input("API Key > ").strip()
     
-    df = pd.read_csv(data_path)
+    df = load_knowledge_base(data_path, columns=["simulation_id", "full_transcript"])
     engine = AnalysisEngine()
 
     print("\n" + "="*60)
@@ -81,6 +142,11 @@ def run_comparison():
         # Use sample(n) where n is min(3, len(df)) in case df is small
         n_samples = min(3, len(df))
         samples = df.sample(n_samples)
+
+        # Send every GPT request up front so they run concurrently
+        gpt_results = []
+        if api_key:
+            gpt_results = asyncio.run(engine.analyze_gpt_many(samples['full_transcript'].tolist(), api_key))
         
         for i, (index, row) in enumerate(samples.iterrows()):
             print(f"\n--- SAMPLE {i+1}: {row['simulation_id']} ---")
@@ -94,7 +160,7 @@ def run_comparison():
             # GPT
             if api_key:
                 print(" [GPT-4o]")
-                gpt_res = engine.analyze_gpt(row['full_transcript'], api_key)
+                gpt_res = gpt_results[i]
                 
                 # --- NEW DEBUGGING LINES ---
                 if "error" in gpt_res:
@@ -0,0 +1,115 @@
+import sys
+import json
+import time
+import argparse
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Dict, Tuple
+
+DEFAULT_CHUNK = 16
+
+
+def read_queries(lines: Iterable[str], fields: List[str], id_field: str = "id") -> Iterator[Tuple[object, str]]:
+    """
+    Yields (id, query) per non-empty JSONL line. The query is the given fields
+    joined by newlines (e.g. --field title --field body); a line that is not a
+    JSON object is used as the query text itself. Lines without an id are
+    numbered from 1.
+    """
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = line
+        if not isinstance(record, dict):
+            yield line_no, line
+            continue
+        query = "\n".join(str(record[f]) for f in fields if record.get(f))
+        yield record.get(id_field, line_no), query
+
+
+def process_stream(run_batch: Callable, items: Iterable[Tuple[object, str]], workers: int = 1,
+                   chunk_size: int = DEFAULT_CHUNK, include_timings: bool = False) -> Iterator[Dict]:
+    """
+    Runs `run_batch` (generate_steps_batch, or WorkerPool.run to use worker
+    processes) over chunks of the input on `workers` threads and yields one
+    record per query in input order. At most 2 * workers chunks are in flight,
+    so arbitrarily large inputs stream in constant memory.
+    """
+    def run(chunk: List[Tuple[object, str]]) -> List[Dict]:
+        queries = [query for _, query in chunk if query]
+        try:
+            results = iter(run_batch(queries, include_timings=include_timings) if queries else [])
+        except Exception as e:
+            return [{"id": item_id, "error": str(e)} for item_id, _ in chunk]
+        return [{"id": item_id, **next(results)} if query else {"id": item_id, "error": "Empty query"}
+                for item_id, query in chunk]
+
+    items = iter(items)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(items, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(run, chunk))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run generate_steps over JSONL queries and write JSONL results.")
+    parser.add_argument("--input", default="-", help="JSONL file with one query per line ('-' for stdin).")
+    parser.add_argument("--output", default="-", help="JSONL results file ('-' for stdout).")
+    parser.add_argument("--field", action="append", help="Field(s) holding the query text (default: query).")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--workers", type=int, default=1, help="Chunks processed in parallel.")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="Run the chunks in this many core-pinned worker processes (see src/worker_pool.py).")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK, help="Queries per generate_steps_batch call.")
+    parser.add_argument("--timings", action="store_true", help="Include per-stage timings in each result.")
+    parser.add_argument("--data", default="data/processed/knowledge_base.csv")
+    parser.add_argument("--retriever", choices=["tfidf", "dense"], default="tfidf")
+    parser.add_argument("--classification-mode", default="mnli")
+    parser.add_argument("--summary-mode", default="window")
+    args = parser.parse_args()
+
+    from src.result_cache import result_cache_from_env
+    from src.worker_pool import WorkerPool, build_generator
+    factory = functools.partial(build_generator, data_path=args.data, retriever=args.retriever,
+                                classification_mode=args.classification_mode, summary_mode=args.summary_mode,
+                                result_cache=result_cache_from_env())
+    pool = None
+    if args.processes:
+        pool = WorkerPool(factory, "generate_steps_batch", args.processes).start()
+        run_batch, workers = pool.run, max(args.workers, args.processes)
+    else:
+        run_batch, workers = factory().generate_steps_batch, args.workers
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding='utf-8')
+    sink = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+    start = time.perf_counter()
+    written = failed = 0
+    try:
+        items = read_queries(source, args.field or ["query"], args.id_field)
+        for record in process_stream(run_batch, items, workers, args.chunk_size, args.timings):
+            sink.write(json.dumps(record) + "\n")
+            sink.flush()
+            written += 1
+            failed += "error" in record
+    finally:
+        if pool is not None:
+            pool.close()
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    elapsed = time.perf_counter() - start
+    print(f"{written} queries ({failed} failed) in {elapsed:.1f}s", file=sys.stderr)
@@ -0,0 +1,50 @@
+from typing import List, Callable, Any
+
+# Default number of texts sent through a pipeline in one forward pass
+DEFAULT_BATCH_SIZE = 8
+
+
+def length_buckets(texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE) -> List[List[int]]:
+    """
+    Groups text positions into batches of similar length, so each padded
+    batch wastes as little compute on padding tokens as possible.
+    """
+    batch_size = max(1, batch_size)
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def run_batched(fn: Callable[[List[str]], List[Any]], texts: List[str],
+                batch_size: int = DEFAULT_BATCH_SIZE) -> List[Any]:
+    """
+    Runs fn over length-bucketed batches and returns the outputs in input order.
+
+    If a whole batch fails, its texts are retried one at a time so a single bad
+    input only affects its own result (which is then the raised exception).
+    """
+    results: List[Any] = [None] * len(texts)
+    for bucket in length_buckets(texts, batch_size):
+        batch = [texts[i] for i in bucket]
+        try:
+            outputs = as_list(fn(batch))
+        except Exception as e:
+            if len(batch) == 1:
+                results[bucket[0]] = e
+                continue
+            outputs = []
+            for text in batch:
+                try:
+                    outputs.append(as_list(fn([text]))[0])
+                except Exception as e:
+                    outputs.append(e)
+
+        for i, output in zip(bucket, outputs):
+            results[i] = output
+    return results
+
+
+def as_list(output: Any) -> List[Any]:
+    """
+    HuggingFace pipelines return a bare dict instead of a list for single inputs.
+    """
+    return [output] if isinstance(output, dict) else list(output)
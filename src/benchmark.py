@@ -0,0 +1,350 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Callable, Optional, Tuple
+import numpy as np
+
+BASELINE_DIR = "data/benchmarks"
+SUITES = ("retrieval", "classification", "summarization", "generate_steps", "ingest")
+DEFAULT_SIZES = [1000, 10000, 100000]
+# Metrics compared against a baseline; True means higher is better
+COMPARED_METRICS = {
+    "p50_ms": False, "p95_ms": False, "p99_ms": False,
+    "throughput_per_s": True, "batch_throughput_per_s": True,
+    "load_s": False, "build_s": False, "peak_rss_mb": False,
+}
+
+# Words used to generate synthetic calls, by category keyword (see knowledge_base.CATEGORY_PATTERNS)
+TOPICS = {
+    "Insurance": ("Claim Center", ["claim", "accident", "policy", "deductible", "adjuster", "vehicle", "damage", "coverage"]),
+    "Payment": ("Credit Services", ["payment", "card", "balance", "billing", "autopay", "statement", "due", "refund"]),
+    "Flight": ("Airline Reservations", ["flight", "seat", "boarding", "baggage", "itinerary", "departure", "gate", "upgrade"]),
+    "Order": ("Retail Shipping", ["order", "package", "tracking", "delivery", "warehouse", "return", "carrier", "shipped"]),
+    "Other": ("Help Desk", ["account", "password", "profile", "address", "email", "settings", "login", "reset"]),
+}
+COMMON = ["please", "thank", "you", "can", "help", "verify", "number", "today", "minute", "check", "update", "confirm"]
+
+
+def synthetic_corpus(n: int, seed: int = 0, turns: int = 6) -> Tuple[List[str], List[str]]:
+    """
+    n (company, transcript) pairs spread over the category topics.
+    """
+    rng = random.Random(seed)
+    keys = list(TOPICS)
+    companies, transcripts = [], []
+    for i in range(n):
+        company, words = TOPICS[keys[i % len(keys)]]
+        lines = []
+        for t in range(turns):
+            speaker = "TRAINEE" if t % 2 == 0 else "SYM"
+            sentence = rng.choices(words, k=5) + rng.choices(COMMON, k=6)
+            rng.shuffle(sentence)
+            lines.append(f"{speaker}: {' '.join(sentence)}.")
+        companies.append(f"{company} {i % 7}")
+        transcripts.append("\n".join(lines))
+    return companies, transcripts
+
+
+def synthetic_queries(n: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    keys = list(TOPICS)
+    queries = []
+    for i in range(n):
+        words = TOPICS[keys[i % len(keys)]][1]
+        queries.append("Customer says: " + " ".join(rng.choices(words, k=3) + rng.choices(COMMON, k=3)))
+    return queries
+
+
+def write_raw_tree(root: str, n_files: int, seed: int = 0, items_per_file: int = 12):
+    """
+    Writes simulation JSONs in the data/raw layout (one folder per company).
+    """
+    companies, transcripts = synthetic_corpus(n_files, seed, turns=items_per_file)
+    for i, (company, transcript) in enumerate(zip(companies, transcripts)):
+        folder = os.path.join(root, company)
+        os.makedirs(folder, exist_ok=True)
+        items = [{"sequenceNumber": s, "actor": line.split(":", 1)[0], "fileTranscript": line.split(":", 1)[1]}
+                 for s, line in enumerate(transcript.split("\n"))]
+        with open(os.path.join(folder, f"sim_{i}.json"), 'w', encoding='utf-8') as f:
+            json.dump({"name": f"Simulation {i}", "audioContentItems": items}, f)
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process so far.
+    """
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def latency_stats(latencies: List[float]) -> Dict:
+    ms = np.asarray(latencies) * 1000
+    return {
+        "n": len(latencies),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "throughput_per_s": round(len(latencies) / max(float(ms.sum()) / 1000, 1e-9), 2),
+    }
+
+
+def time_calls(fn: Callable, inputs: List, warmup: int = 3) -> Dict:
+    for x in inputs[:warmup]:
+        fn(x)
+    latencies = []
+    for x in inputs:
+        start = time.perf_counter()
+        fn(x)
+        latencies.append(time.perf_counter() - start)
+    return latency_stats(latencies)
+
+
+def timed(fn: Callable):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+# --- Benchmarks (each runs in its own process, see run_isolated) ---
+
+def bench_retrieval(size: int, queries: int, seed: int) -> Dict:
+    """
+    The find_best_match_transcript path: category partition lookup, TF-IDF
+    best match inside the partition, transcript fetch.
+    """
+    from src.retrieval import TfidfIndex, build_category_partitions, partition_for_category
+    from src.models import CATEGORIES
+    import pandas as pd
+
+    companies, transcripts = synthetic_corpus(size, seed)
+    partitions = build_category_partitions(pd.Series(companies))
+
+    def build():
+        index = TfidfIndex().fit(transcripts)
+        for name, rows in partitions.items():
+            if len(rows) > 0:
+                index.add_partition(name, rows)
+        return index
+
+    index, build_s = timed(build)
+    rng = random.Random(seed)
+    cases = [(q, rng.choice(CATEGORIES)) for q in synthetic_queries(queries, seed + 1)]
+
+    def find(case):
+        query, category = case
+        return transcripts[index.best_match(query, partition=partition_for_category(category, partitions))]
+
+    return {"corpus_size": size, "build_s": round(build_s, 3), **time_calls(find, cases)}
+
+
+def bench_classification(queries: int, seed: int, mode: str = "mnli") -> Dict:
+    """
+    get_category: one zero-shot classification per query, plus the batched path.
+    """
+    from src.models import get_classifier
+    from src.fast_classifier import IntentClassifier
+    from src.models import CATEGORIES
+
+    _, load_s = timed(get_classifier)
+    intent = IntentClassifier(CATEGORIES, mode)
+    texts = synthetic_queries(queries, seed)
+    stats = time_calls(intent.classify, texts)
+    _, batch_s = timed(lambda: intent.classify_batch(texts))
+    return {"mode": mode, "load_s": round(load_s, 3), **stats,
+            "batch_throughput_per_s": round(len(texts) / max(batch_s, 1e-9), 2)}
+
+
+def bench_summarization(calls: int, seed: int) -> Dict:
+    """
+    One summarizer call per retrieved-case window (no cache), plus the batched path.
+    """
+    from src.models import get_summarizer, model_id, SUMMARIZER_MODEL
+    from src.models import SUMMARY_PARAMS
+    from src.summary_cache import SummaryCache, cached_summarize
+    from src.batching import DEFAULT_BATCH_SIZE
+
+    summarizer, load_s = timed(get_summarizer)
+    _, transcripts = synthetic_corpus(calls, seed, turns=16)
+    texts = [t[:1024] for t in transcripts]
+    stats = time_calls(lambda text: summarizer(text, **SUMMARY_PARAMS), texts, warmup=1)
+    _, batch_s = timed(lambda: cached_summarize(summarizer, texts, SummaryCache(max_entries=0),
+                                                model_id(SUMMARIZER_MODEL), SUMMARY_PARAMS, DEFAULT_BATCH_SIZE))
+    return {"load_s": round(load_s, 3), **stats, "batch_throughput_per_s": round(len(texts) / max(batch_s, 1e-9), 2)}
+
+
+def bench_generate_steps(size: int, queries: int, seed: int) -> Dict:
+    """
+    End-to-end generate_steps on a synthetic knowledge base, with a cold summary cache.
+    """
+    import pandas as pd
+    from src.generator import FewShotGenerator
+    from src.summary_cache import SummaryCache
+
+    companies, transcripts = synthetic_corpus(size, seed, turns=16)
+    tmp_dir = tempfile.mkdtemp(prefix="symtrain_bench_")
+    try:
+        data_path = os.path.join(tmp_dir, "knowledge_base.csv")
+        pd.DataFrame({"simulation_id": [f"sim {i}" for i in range(size)], "company": companies,
+                      "full_transcript": transcripts}).to_csv(data_path, index=False)
+        generator, load_s = timed(lambda: FewShotGenerator(data_path=data_path, persist_summaries=False))
+        # max_entries=0 keeps nothing, so every call pays for the summarizer
+        generator.summary_cache = SummaryCache(max_entries=0)
+        stats = time_calls(generator.generate_steps, synthetic_queries(queries, seed + 1), warmup=1)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return {"corpus_size": size, "load_s": round(load_s, 3), **stats}
+
+
+def bench_ingest(files: int, seed: int, repeats: int = 3) -> Dict:
+    """
+    load_simulation_data + process_transcripts over a generated raw JSON tree.
+    """
+    from src import data_loader
+
+    tmp_dir = tempfile.mkdtemp(prefix="symtrain_bench_")
+    try:
+        raw_dir = os.path.join(tmp_dir, "raw")
+        write_raw_tree(raw_dir, files, seed)
+        data_loader.RAW_DIR = raw_dir
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            df = data_loader.process_transcripts(data_loader.load_simulation_data())
+            latencies.append(time.perf_counter() - start)
+        if len(df) != files:
+            raise RuntimeError(f"Expected {files} rows, got {len(df)}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    stats = latency_stats(latencies)
+    stats["files_per_s"] = round(files / (min(latencies) or 1e-9), 1)
+    return {"files": files, **stats}
+
+
+def _run_case(fn_name: str, kwargs: Dict) -> Dict:
+    result = globals()[fn_name](**kwargs)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def run_isolated(fn_name: str, **kwargs) -> Dict:
+    """
+    Runs one benchmark in a fresh process so load time and peak RSS are its own.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_run_case, fn_name, kwargs).result()
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        import torch
+        torch_version, threads = torch.__version__, torch.get_num_threads()
+    except (ImportError, AttributeError):
+        torch_version, threads = None, None
+    from src.models import INFERENCE_BACKEND
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch_version,
+        "torch_threads": threads,
+        "inference_backend": INFERENCE_BACKEND,
+    }
+
+
+def run_suite(suites: List[str], sizes: List[int], queries: int, model_queries: int,
+              e2e_size: int, ingest_files: int, seed: int) -> Dict:
+    cases = []
+    if "retrieval" in suites:
+        cases += [(f"retrieval@{size}", "bench_retrieval", {"size": size, "queries": queries, "seed": seed}) for size in sizes]
+    if "classification" in suites:
+        cases.append(("classification", "bench_classification", {"queries": model_queries, "seed": seed}))
+    if "summarization" in suites:
+        cases.append(("summarization", "bench_summarization", {"calls": model_queries, "seed": seed}))
+    if "generate_steps" in suites:
+        cases.append((f"generate_steps@{e2e_size}", "bench_generate_steps",
+                      {"size": e2e_size, "queries": model_queries, "seed": seed}))
+    if "ingest" in suites:
+        cases.append((f"ingest@{ingest_files}", "bench_ingest", {"files": ingest_files, "seed": seed}))
+
+    results = {}
+    for name, fn_name, kwargs in cases:
+        print(f"Running {name}...")
+        try:
+            results[name] = run_isolated(fn_name, **kwargs)
+        except Exception as e:
+            results[name] = {"error": str(e)}
+        print(f"  {json.dumps(results[name])}")
+    return {"environment": environment(), "results": results}
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float = 0.1) -> List[Dict]:
+    """
+    Metrics that got worse than the baseline by more than `tolerance` (relative).
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "error" in base or "error" in result:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in result or not base.get(metric):
+                continue
+            change = (result[metric] - base[metric]) / base[metric]
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append({"case": name, "metric": metric, "baseline": base[metric],
+                                    "current": result[metric], "change": round(change, 4)})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the retrieval, model and ingestion hot paths.")
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+                        help="Synthetic corpus sizes for retrieval (up to 1000000).")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per retrieval benchmark.")
+    parser.add_argument("--model-queries", type=int, default=30, help="Calls per model benchmark.")
+    parser.add_argument("--e2e-size", type=int, default=1000, help="Knowledge base size for generate_steps.")
+    parser.add_argument("--ingest-files", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help=f"Default: {BASELINE_DIR}/<commit>.json")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative slowdown before failing.")
+    args = parser.parse_args()
+
+    report = run_suite(args.suite, args.sizes, args.queries, args.model_queries,
+                       args.e2e_size, args.ingest_files, args.seed)
+
+    output = args.output or os.path.join(BASELINE_DIR, f"{report['environment']['commit'] or 'latest'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results saved to: {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.compare}:")
+            for r in regressions:
+                print(f"  {r['case']} {r['metric']}: {r['baseline']} -> {r['current']} ({r['change']:+.1%})")
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%}).")
@@ -1,13 +1,26 @@
 import os
+import csv
 import json
+import hashlib
 import zipfile
 import shutil
-import pandas as pd
-from typing import List, Dict
+import argparse
+from collections import deque
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Iterable, Iterator, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Constants
 RAW_DIR = "data/raw"
 TEMP_ZIP_DIR = "data/temp_zips"
+OUTPUT_PATH = "data/processed/knowledge_base.csv"
+REPORT_PATH = "data/processed/ingest_report.json"
+MANIFEST_PATH = "data/processed/ingest_manifest.json"
+MANIFEST_VERSION = 1
+KB_COLUMNS = ["simulation_id", "company", "full_transcript"]
 
 def repair_directory_structure():
     """
@@ -73,11 +86,22 @@ def repair_directory_structure():
     print("--- REPAIR COMPLETE ---\n")
     return True
 
+def find_audio_items(data) -> Optional[list]:
+    """
+    Returns the audio items of a simulation JSON (key is matched case-insensitively).
+    """
+    if not isinstance(data, dict):
+        return None
+    keys = {k.lower(): k for k in data.keys()}
+    audio_key = keys.get("audiocontentitems")
+    return data[audio_key] if audio_key else None
+
 def load_simulation_data() -> List[Dict]:
     """
     Walks through the subfolders and finds the JSONs.
     """
     simulations = []
+    skipped = []
     print(f"Scanning {RAW_DIR} for JSON files...")
     
     for root, dirs, files in os.walk(RAW_DIR):
@@ -89,85 +113,483 @@ def load_simulation_data() -> List[Dict]:
                     with open(file_path, 'r', encoding='utf-8-sig') as f:
                         data = json.load(f)
                         
-                        # Find the correct key (case-insensitive)
-                        keys = {k.lower(): k for k in data.keys()}
-                        audio_key = keys.get("audiocontentitems")
+                        audio_items = find_audio_items(data)
                         
-                        if audio_key:
+                        if audio_items is not None:
                             simulations.append({
                                 "file_path": file_path,
                                 "company": os.path.basename(os.path.dirname(file_path)),
                                 "simulation_id": data.get("name", "unknown"),
-                                "audio_items": data[audio_key]
+                                "audio_items": audio_items
                             })
+                        else:
+                            skipped.append(file_path)
                 except Exception as e:
-                    pass # Skip unreadable files
+                    print(f"Warning: could not read {file_path}: {e}")
+                    skipped.append(file_path)
                     
-    print(f"Found {len(simulations)} valid simulations.")
+    print(f"Found {len(simulations)} valid simulations ({len(skipped)} files skipped).")
     return simulations
 
-def process_transcripts(simulations: List[Dict]) -> pd.DataFrame:
+def merge_transcript(audio_items: list) -> str:
+    """
+    Merges consecutive lines of the same speaker into one readable turn.
+    """
+    full_transcript = []
+    current_speaker = None
+    current_block = []
+
+    # Sort items
+    audio_items.sort(key=lambda x: x.get('sequenceNumber', 0) if isinstance(x, dict) else 0)
+
+    for item in audio_items:
+        if not isinstance(item, dict): continue
+        
+        actor = item.get("actor", "Unknown")
+        text = item.get("fileTranscript", "")
+        
+        if not text or not isinstance(text, str): continue
+        text = text.strip()
+        if not text: continue
+
+        if actor != current_speaker:
+            if current_speaker is not None:
+                full_transcript.append(f"{current_speaker}: {' '.join(current_block)}")
+            current_speaker = actor
+            current_block = [text]
+        else:
+            current_block.append(text)
+    
+    if current_speaker and current_block:
+        full_transcript.append(f"{current_speaker}: {' '.join(current_block)}")
+
+    return "\n".join(full_transcript)
+
+def process_transcripts(simulations: List[Dict]) -> "pd.DataFrame":
     """
     Merges dialogue into a readable script.
     """
+    import pandas as pd
     processed_data = []
 
     for sim in simulations:
-        audio_items = sim["audio_items"]
-        full_transcript = []
-        current_speaker = None
-        current_block = []
-
-        # Sort items
-        audio_items.sort(key=lambda x: x.get('sequenceNumber', 0) if isinstance(x, dict) else 0)
-
-        for item in audio_items:
-            if not isinstance(item, dict): continue
-            
-            actor = item.get("actor", "Unknown")
-            text = item.get("fileTranscript", "")
-            
-            if not text or not isinstance(text, str): continue
-            text = text.strip()
-            if not text: continue
-
-            if actor != current_speaker:
-                if current_speaker is not None:
-                    full_transcript.append(f"{current_speaker}: {' '.join(current_block)}")
-                current_speaker = actor
-                current_block = [text]
-            else:
-                current_block.append(text)
-        
-        if current_speaker and current_block:
-            full_transcript.append(f"{current_speaker}: {' '.join(current_block)}")
-        
         processed_data.append({
             "simulation_id": sim["simulation_id"],
             "company": sim["company"],
-            "full_transcript": "\n".join(full_transcript)
+            "full_transcript": merge_transcript(sim["audio_items"])
         })
 
     return pd.DataFrame(processed_data)
 
+def export_columnar(output_path: str = OUTPUT_PATH) -> Optional[str]:
+    """
+    Writes the Parquet copy of the knowledge base next to the CSV (needs pyarrow).
+    """
+    try:
+        import pyarrow
+        from src.knowledge_base import export_parquet
+    except ImportError as e:
+        print(f"Skipping the Parquet export ({e}).")
+        return None
+    parquet_path = export_parquet(output_path)
+    if parquet_path:
+        print(f"Columnar copy saved to: {parquet_path}")
+    return parquet_path
+
+# --- Streaming ingestion ---
+
+def scan_entries(start_path: str = RAW_DIR) -> Iterator[os.DirEntry]:
+    """
+    Lazily yields the non-directory entries under start_path (depth-first, like
+    os.walk) without listing the whole tree up front. Shared by
+    discover_json_files and the raw index (src.file_inspector).
+    """
+    stack = [start_path]
+    while stack:
+        folder = stack.pop()
+        subfolders = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if is_dir:
+                        subfolders.append(entry.path)
+                    else:
+                        yield entry
+        except OSError as e:
+            print(f"Warning: cannot scan {folder}: {e}")
+        # Reversed so folders are visited in listing order
+        stack.extend(reversed(subfolders))
+
+def discover_json_files(start_path: str = RAW_DIR) -> Iterator[str]:
+    """
+    Lazily yields JSON file paths under start_path.
+    """
+    for entry in scan_entries(start_path):
+        if entry.name.lower().endswith(".json"):
+            yield entry.path
+
+def parse_simulation_file(file_path: str) -> Dict:
+    """
+    Parses one simulation JSON into a knowledge base row (runs in a worker process).
+    Only the merged transcript travels back, never the raw audio items.
+    Unreadable files and unexpected structures (e.g. mixed-type sequence
+    numbers) are reported as corrupt instead of failing the whole ingest.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8-sig') as f:
+            data = json.load(f)
+        return simulation_result(data, file_path)
+    except (ValueError, UnicodeDecodeError, OSError, TypeError, AttributeError, KeyError) as e:
+        return {"status": "corrupt", "file_path": file_path, "reason": f"{type(e).__name__}: {e}"}
+
+def simulation_result(data, file_path: str) -> Dict:
+    """
+    Turns parsed simulation JSON into an ok/skipped result. The company is the
+    name of the folder holding the file, as in the extracted data/raw layout.
+    """
+    audio_items = find_audio_items(data)
+    if audio_items is None:
+        return {"status": "skipped", "file_path": file_path, "reason": "no audioContentItems"}
+    if not isinstance(audio_items, list):
+        return {"status": "skipped", "file_path": file_path, "reason": "audioContentItems is not a list"}
+
+    return {
+        "status": "ok",
+        "file_path": file_path,
+        "row": {
+            "simulation_id": data.get("name", "unknown"),
+            "company": os.path.basename(os.path.dirname(file_path)),
+            "full_transcript": merge_transcript(audio_items)
+        }
+    }
+
+def stream_ingest(start_path: str = RAW_DIR, output_path: str = OUTPUT_PATH, workers: int = None,
+                  max_pending: int = 256, report_path: str = REPORT_PATH, files: Iterable[str] = None,
+                  zips: Iterable[str] = ()) -> Dict:
+    """
+    Discovers, parses and writes simulations as a stream:
+    - files come from `files` (e.g. RawIndex.json_files()) or a scandir walk of start_path
+    - `zips` are read in place with parse_zip_archive (nothing is extracted)
+    - files are parsed in a process pool
+    - at most `max_pending` files are in flight, so memory stays flat
+    - rows are appended to the CSV as soon as they are ready (in discovery order)
+    Skipped and corrupt files are counted and listed in the report. When no
+    simulation is found the existing knowledge base is left untouched.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    report = {"ok": 0, "skipped": 0, "corrupt": 0, "skipped_files": [], "corrupt_files": []}
+
+    def record(result: Dict, writer):
+        if "zip" in result:
+            # parse_zip_archive: one result per JSON member, or an unreadable archive
+            if not result["error"]:
+                for sim in result["results"]:
+                    record(sim, writer)
+                return
+            result = {"status": "corrupt", "file_path": result["zip"], "reason": result["error"]}
+        status = result["status"]
+        report[status] += 1
+        if status == "ok":
+            row = result["row"]
+            writer.writerow([row[c] for c in KB_COLUMNS])
+        else:
+            report[f"{status}_files"].append({"file_path": result["file_path"], "reason": result["reason"]})
+
+    files = discover_json_files(start_path) if files is None else files
+    tasks = chain(((parse_simulation_file, path) for path in files), ((parse_zip_archive, path) for path in zips))
+
+    print(f"Streaming simulations from {start_path}...")
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as out, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(KB_COLUMNS)
+
+        pending = deque()
+        for parse, path in tasks:
+            pending.append(pool.submit(parse, path))
+            # Backpressure: wait for the oldest file before discovering more
+            if len(pending) >= max_pending:
+                record(pending.popleft().result(), writer)
+        while pending:
+            record(pending.popleft().result(), writer)
+
+    if report["ok"]:
+        os.replace(tmp_path, output_path)
+        export_columnar(output_path)
+    else:
+        os.remove(tmp_path)
+        print(f"No simulations found; keeping the existing knowledge base at {output_path}.")
+
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(f"Ingested {report['ok']} simulations ({report['skipped']} skipped, {report['corrupt']} corrupt).")
+    for entry in report["corrupt_files"][:20]:
+        print(f"  corrupt: {entry['file_path']} ({entry['reason']})")
+    return report
+
+# --- Incremental ingestion ---
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stat_entry(path: str, previous: Optional[Dict] = None) -> Dict:
+    """
+    Size, mtime and content hash of a file. The hash is only recomputed when
+    size or mtime changed since the previous manifest entry.
+    """
+    st = os.stat(path)
+    entry = {"size": st.st_size, "mtime": st.st_mtime}
+    if previous and previous.get("size") == st.st_size and previous.get("mtime") == st.st_mtime:
+        entry["sha256"] = previous["sha256"]
+    else:
+        entry["sha256"] = file_sha256(path)
+    return entry
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict:
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    return {"version": MANIFEST_VERSION, "units": {}}
+
+def save_manifest(manifest: Dict, path: str = MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+def parse_zip_archive(zip_path: str, known_members: Dict = None) -> Dict:
+    """
+    Parses the simulation JSONs of one zip straight from the archive (nothing is
+    extracted to disk). Members whose CRC and size match `known_members` are
+    not re-read. Runs in a worker process.
+    """
+    known_members = known_members or {}
+    zip_name = os.path.basename(zip_path)
+    folder_name = zip_name.replace(".zip", "").strip()
+    result = {"zip": zip_name, "members": {}, "results": [], "error": None}
+
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".json"):
+                    continue
+                member = {"crc": info.CRC, "size": info.file_size}
+                result["members"][info.filename] = member
+                if known_members.get(info.filename) == member:
+                    continue
+
+                # Same path the file would have after extraction, so company names match
+                file_path = os.path.join(os.path.dirname(zip_path), folder_name, info.filename)
+                try:
+                    data = json.loads(zf.read(info).decode('utf-8-sig'))
+                    sim = simulation_result(data, file_path)
+                except (ValueError, UnicodeDecodeError, zipfile.BadZipFile, TypeError, AttributeError, KeyError) as e:
+                    sim = {"status": "corrupt", "file_path": file_path, "reason": f"{type(e).__name__}: {e}"}
+                sim["source"] = f"{zip_name}::{info.filename}"
+                result["results"].append(sim)
+    except (zipfile.BadZipFile, OSError) as e:
+        result["error"] = str(e)
+    return result
+
+def parse_loose_file(file_path: str, start_path: str) -> Dict:
+    sim = parse_simulation_file(file_path)
+    sim["source"] = os.path.relpath(file_path, start_path)
+    return sim
+
+def incremental_ingest(start_path: str = RAW_DIR, output_path: str = OUTPUT_PATH,
+                       manifest_path: str = MANIFEST_PATH, workers: int = None,
+                       report_path: str = REPORT_PATH) -> Dict:
+    """
+    Refreshes the knowledge base from only the archives/files that changed.
+
+    - Zips are read in place (no wipe and re-extract); within a changed zip only
+      new or modified members (by CRC/size) are parsed.
+    - Loose JSON files outside the extracted zip folders are tracked too.
+    - Rows are keyed by a 'source' column, so only rows of changed or deleted
+      files are replaced in the knowledge base.
+    """
+    import pandas as pd
+    manifest = load_manifest(manifest_path)
+    units = manifest["units"]
+
+    existing = None
+    if os.path.exists(output_path) and units:
+        existing = pd.read_csv(output_path)
+        if "source" not in existing.columns:
+            existing = None
+    if existing is None:
+        # No usable previous state: rebuild everything from the archives
+        units = {}
+        existing = pd.DataFrame(columns=KB_COLUMNS + ["source"])
+
+    # 1. Find what is on disk now
+    zips = sorted(f for f in os.listdir(start_path) if f.endswith(".zip")) if os.path.isdir(start_path) else []
+    extracted_folders = {os.path.join(start_path, z.replace(".zip", "").strip()) for z in zips}
+    loose = [
+        p for p in discover_json_files(start_path)
+        if not any(p.startswith(folder + os.sep) for folder in extracted_folders)
+    ] if os.path.isdir(start_path) else []
+
+    current = {}
+    for name in zips:
+        key = f"zip:{name}"
+        current[key] = stat_entry(os.path.join(start_path, name), units.get(key))
+    for path in loose:
+        key = f"file:{os.path.relpath(path, start_path)}"
+        current[key] = stat_entry(path, units.get(key))
+
+    changed = [k for k, entry in current.items() if units.get(k, {}).get("sha256") != entry["sha256"]]
+    removed = [k for k in units if k not in current]
+    print(f"Incremental ingest: {len(changed)} changed/new, {len(removed)} removed, "
+          f"{len(current) - len(changed)} unchanged.")
+
+    report = {"ok": 0, "skipped": 0, "corrupt": 0, "skipped_files": [], "corrupt_files": []}
+    if not changed and not removed:
+        # Nothing to parse: leave the CSV and Parquet files untouched
+        for key in current:
+            current[key]["members"] = units[key].get("members", {})
+            current[key]["sources"] = units[key].get("sources", [])
+        if current != units:
+            # Only mtimes moved; remember them so the files are not hashed again next time
+            manifest["units"] = current
+            save_manifest(manifest, manifest_path)
+        report.update({"rows_removed": 0, "rows_added": 0, "total_rows": len(existing)})
+        if report_path:
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+        print(f"Knowledge base is up to date ({report['total_rows']} rows).")
+        return report
+
+    # 2. Parse only what changed
+    stale_sources = set()
+    new_rows = []
+
+    for key in removed:
+        stale_sources.update(units[key].get("sources", []))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for key in changed:
+            kind, name = key.split(":", 1)
+            if kind == "zip":
+                known = units.get(key, {}).get("members", {})
+                futures[key] = pool.submit(parse_zip_archive, os.path.join(start_path, name), known)
+            else:
+                futures[key] = pool.submit(parse_loose_file, os.path.join(start_path, name), start_path)
+
+        for key in changed:
+            parsed = futures[key].result()
+            previous = units.get(key, {})
+            entry = current[key]
+
+            if key.startswith("zip:"):
+                if parsed["error"]:
+                    print(f"Warning: {parsed['zip']} is corrupt ({parsed['error']}).")
+                    report["corrupt"] += 1
+                    report["corrupt_files"].append({"file_path": parsed["zip"], "reason": parsed["error"]})
+                    # Keep the old rows rather than losing them to a half-copied zip
+                    current[key] = previous
+                    continue
+                old_members = previous.get("members", {})
+                for member, info in old_members.items():
+                    if parsed["members"].get(member) != info:
+                        stale_sources.add(f"{parsed['zip']}::{member}")
+                entry["members"] = parsed["members"]
+                results = parsed["results"]
+            else:
+                stale_sources.update(previous.get("sources", []))
+                results = [parsed]
+
+            sources = set(previous.get("sources", [])) - stale_sources
+            for sim in results:
+                report[sim["status"]] += 1
+                if sim["status"] == "ok":
+                    new_rows.append(dict(sim["row"], source=sim["source"]))
+                    sources.add(sim["source"])
+                else:
+                    report[f"{sim['status']}_files"].append({"file_path": sim["file_path"], "reason": sim["reason"]})
+            entry["sources"] = sorted(sources)
+
+    for key in current:
+        if key not in changed:
+            current[key]["members"] = units[key].get("members", {})
+            current[key]["sources"] = units[key].get("sources", [])
+
+    # 3. Upsert: drop stale rows, append the new ones
+    kept = existing[~existing["source"].isin(stale_sources)]
+    df = pd.concat([kept, pd.DataFrame(new_rows, columns=KB_COLUMNS + ["source"])], ignore_index=True)
+
+    # A changed file can still leave the rows as they were (e.g. a zip that stays corrupt)
+    if new_rows or len(kept) != len(existing):
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        tmp_path = output_path + ".tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, output_path)
+        export_columnar(output_path)
+
+    manifest["units"] = current
+    save_manifest(manifest, manifest_path)
+
+    report.update({"rows_removed": len(existing) - len(kept), "rows_added": len(new_rows), "total_rows": len(df)})
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"Knowledge base: {report['rows_added']} rows added, {report['rows_removed']} removed, "
+          f"{report['total_rows']} total.")
+    return report
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the knowledge base from the raw simulation archives.")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count).")
+    parser.add_argument("--max-pending", type=int, default=256, help="Max files in flight at once.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only parse new/changed archives (tracked in the ingest manifest).")
+    parser.add_argument("--from-index", action="store_true",
+                        help="Take the file list from the raw index (python -m src.file_inspector) "
+                             "instead of repairing and walking data/raw; known-invalid JSON is skipped.")
+    args = parser.parse_args()
+
+    if args.incremental:
+        # Reads the zips in place, no repair/re-extract needed
+        incremental_ingest(RAW_DIR, OUTPUT_PATH, MANIFEST_PATH, workers=args.workers)
+
+    elif args.from_index:
+        from src.file_inspector import RawIndex, INDEX_PATH
+        with RawIndex(INDEX_PATH) as index:
+            # Only files whose size/mtime changed since the last inventory are re-read
+            stats = index.refresh(RAW_DIR, workers=args.workers)
+            print(f"Raw index refreshed: {stats['new']} new, {stats['changed']} changed, {stats['removed']} removed.")
+            zips = list(index.zip_files())
+            # Zips are read in place, so skip what an earlier repair extracted from them
+            extracted = tuple(os.path.splitext(z)[0].strip() + os.sep for z in zips)
+            files = [p for p in index.json_files() if not p.startswith(extracted)]
+        if not files and not zips:
+            raise SystemExit(f"No JSON files or zips found under {RAW_DIR}; the knowledge base was not changed.")
+        report = stream_ingest(RAW_DIR, OUTPUT_PATH, workers=args.workers, max_pending=args.max_pending,
+                               files=files, zips=zips)
+
     # 1. Run Repair
-    success = repair_directory_structure()
-    
-    if success:
-        # 2. Load
-        raw_sims = load_simulation_data()
+    elif repair_directory_structure():
+        # 2-4. Load, process and save (streamed)
+        report = stream_ingest(RAW_DIR, OUTPUT_PATH, workers=args.workers, max_pending=args.max_pending)
         
-        if raw_sims:
-            # 3. Process
-            df = process_transcripts(raw_sims)
-            
-            # 4. Save
-            output_path = "data/processed/knowledge_base.csv"
-            os.makedirs("data/processed", exist_ok=True)
-            df.to_csv(output_path, index=False)
-            
-            print(f"\nSUCCESS! Processed {len(df)} simulations.")
-            print(f"Data saved to: {output_path}")
+        if report["ok"]:
+            print(f"\nSUCCESS! Processed {report['ok']} simulations.")
+            print(f"Data saved to: {OUTPUT_PATH}")
+            print(f"Skipped/corrupt files listed in: {REPORT_PATH}")
         else:
-            print("\nERROR: No simulations found even after repair.")
\ No newline at end of file
+            print("\nERROR: No simulations found even after repair.")
@@ -0,0 +1,245 @@
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+from src.retrieval import Retriever
+
+# Small local sentence-embedding model (384 dims, runs fine on CPU)
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def transcript_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Append-only on-disk cache of embeddings keyed by transcript hash.
+
+    Vectors live in one raw float16/float32 file that is opened as a
+    read-only memory map, so the matrix is never fully loaded into RAM.
+    offsets.json maps each transcript hash to its row in that file.
+    """
+
+    def __init__(self, directory: str, dim: int, dtype: str = "float16"):
+        self.directory = directory
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.vectors_path = os.path.join(directory, f"vectors.{self.dtype.name}")
+        self.offsets_path = os.path.join(directory, "offsets.json")
+        os.makedirs(directory, exist_ok=True)
+
+        self.offsets: Dict[str, int] = {}
+        if os.path.exists(self.offsets_path):
+            with open(self.offsets_path, 'r') as f:
+                self.offsets = json.load(f)
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None and self.offsets:
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode='r', shape=(len(self.offsets), self.dim))
+        return self._matrix
+
+    def missing(self, hashes: List[str]) -> List[str]:
+        return [h for h in dict.fromkeys(hashes) if h not in self.offsets]
+
+    def append(self, hashes: List[str], vectors: np.ndarray):
+        """
+        Writes new vectors to the end of the file, then records their offsets.
+        """
+        row_bytes = self.dim * self.dtype.itemsize
+        count = len(self.offsets)
+
+        # Drop any partial write left behind by a crash before offsets.json was saved
+        mode = 'r+b' if os.path.exists(self.vectors_path) else 'wb'
+        with open(self.vectors_path, mode) as f:
+            f.truncate(count * row_bytes)
+            f.seek(count * row_bytes)
+            f.write(np.ascontiguousarray(vectors, dtype=self.dtype).tobytes())
+
+        for i, h in enumerate(hashes):
+            self.offsets[h] = count + i
+
+        tmp_path = self.offsets_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.offsets, f)
+        os.replace(tmp_path, self.offsets_path)
+        self._matrix = None
+
+    def rows_for(self, hashes: List[str]) -> np.ndarray:
+        return np.array([self.offsets[h] for h in hashes], dtype=np.int64)
+
+
+class DenseRetriever(Retriever):
+    """
+    Sentence-embedding retrieval with an approximate nearest-neighbour index.
+
+    - Transcripts are embedded offline in batches and cached by hash, so a
+      restart (or a knowledge base rebuild) only embeds new transcripts.
+    - Search uses an HNSW graph (hnswlib) for sublinear top-k. If hnswlib is
+      not installed we fall back to an exact scan over the memory-mapped matrix.
+    """
+
+    def __init__(self, documents: List[str], cache_dir: str = "data/processed/embeddings",
+                 model_name: str = DEFAULT_EMBEDDING_MODEL, dtype: str = "float16",
+                 batch_size: int = 64, ef_search: int = 64, M: int = 16):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.ef_search = ef_search
+        self.M = M
+        self._model = None
+
+        model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        self.hashes = [transcript_hash(d) for d in documents]
+        self.store = EmbeddingStore(model_dir, self.model.get_sentence_embedding_dimension(), dtype)
+        self.embed_missing(documents)
+
+        self.store_rows = self.store.rows_for(self.hashes)
+        self._partitions: Dict[str, Dict] = {}
+        self.ann = self._load_or_build_ann(model_dir)
+
+    @property
+    def model(self):
+        if self._model is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                raise ImportError("The dense retrieval backend needs `pip install sentence-transformers`.")
+            self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                 convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+
+    def embed_missing(self, documents: List[str]):
+        """
+        Embeds only the transcripts that are not in the on-disk cache yet.
+        """
+        todo = self.store.missing(self.hashes)
+        if not todo:
+            return
+        # Keep only the texts that still need embedding in memory
+        wanted = set(todo)
+        by_hash = {h: d for h, d in zip(self.hashes, documents) if h in wanted}
+
+        print(f"Embedding {len(todo)} new transcripts...")
+        # Flush to disk every few batches so an interrupted run keeps its progress
+        chunk = self.batch_size * 16
+        for start in range(0, len(todo), chunk):
+            hashes = todo[start:start + chunk]
+            self.store.append(hashes, self.embed([by_hash[h] for h in hashes]))
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        # Sorted gather keeps memory-map reads sequential
+        store_rows = self.store_rows[rows]
+        order = np.argsort(store_rows)
+        vectors = np.empty((len(rows), self.store.dim), dtype=np.float32)
+        vectors[order] = self.store.matrix[store_rows[order]]
+        return vectors
+
+    def _load_or_build_ann(self, model_dir: str):
+        try:
+            import hnswlib
+        except ImportError:
+            print("hnswlib not installed, dense retrieval will use an exact scan.")
+            return None
+
+        n_docs = len(self.hashes)
+        # The graph is tied to the exact list of transcripts in row order
+        digest = hashlib.sha1()
+        for h in self.hashes:
+            digest.update(h.encode('ascii'))
+        corpus_key = digest.hexdigest()[:16]
+        path = os.path.join(model_dir, f"hnsw_{corpus_key}.bin")
+
+        ann = hnswlib.Index(space='ip', dim=self.store.dim)
+        if os.path.exists(path):
+            ann.load_index(path, max_elements=n_docs)
+        else:
+            print("Building ANN index...")
+            ann.init_index(max_elements=max(n_docs, 1), ef_construction=200, M=self.M)
+            for start in range(0, n_docs, 10000):
+                rows = np.arange(start, min(start + 10000, n_docs))
+                ann.add_items(self._vectors(rows), rows)
+            ann.save_index(path)
+        ann.set_ef(self.ef_search)
+        return ann
+
+    # --- Retriever interface ---
+
+    def add_partition(self, name: str, rows: np.ndarray):
+        rows = np.asarray(rows, dtype=np.int64)
+        self._partitions[name] = {"rows": rows, "members": set(rows.tolist())}
+
+    def partition_sizes(self) -> Dict[str, int]:
+        return {name: len(part["rows"]) for name, part in self._partitions.items()}
+
+    def search(self, query: str, k: int = 5, rows: Optional[np.ndarray] = None,
+               partition: Optional[str] = None) -> List[Tuple[int, float]]:
+        if partition is not None:
+            rows = self._partitions[partition]["rows"]
+            members = self._partitions[partition]["members"]
+        elif rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            members = set(rows.tolist())
+        else:
+            members = None
+
+        n_candidates = len(self.hashes) if rows is None else len(rows)
+        k = min(k, n_candidates)
+        if k == 0:
+            return []
+
+        query_vec = self.embed([query])
+
+        if self.ann is not None:
+            label_filter = None if members is None or len(members) == len(self.hashes) else members.__contains__
+            self.ann.set_ef(max(self.ef_search, k))
+            try:
+                labels, distances = self.ann.knn_query(query_vec, k=k, filter=label_filter)
+                # hnswlib 'ip' distance is 1 - inner product
+                return [(int(label), float(1.0 - dist)) for label, dist in zip(labels[0], distances[0])]
+            except RuntimeError:
+                # Very small partitions can starve the filtered graph search
+                pass
+
+        return self._exact_search(query_vec[0], rows, k)
+
+    def _exact_search(self, query_vec: np.ndarray, rows: Optional[np.ndarray], k: int) -> List[Tuple[int, float]]:
+        """
+        Chunked scan over the memory-mapped vectors.
+        """
+        if rows is None:
+            rows = np.arange(len(self.hashes))
+        sims = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), 50000):
+            chunk = rows[start:start + 50000]
+            sims[start:start + len(chunk)] = self._vectors(chunk) @ query_vec
+        top = np.argsort(-sims, kind='stable')[:k]
+        return [(int(rows[i]), float(sims[i])) for i in top]
+
+
+if __name__ == "__main__":
+    # Offline embedding job: fills the cache so the app never embeds at startup
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Embed the knowledge base for dense retrieval.")
+    parser.add_argument("--data", default="data/processed/knowledge_base.csv")
+    parser.add_argument("--cache-dir", default="data/processed/embeddings")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data)
+    documents = df['full_transcript'].fillna("").tolist()
+    retriever = DenseRetriever(documents, cache_dir=args.cache_dir, model_name=args.model,
+                               dtype=args.dtype, batch_size=args.batch_size)
+    print(f"Embedding cache holds {len(retriever.store)} transcripts.")
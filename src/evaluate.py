@@ -0,0 +1,358 @@
+import os
+import re
+import json
+import hashlib
+import time
+import asyncio
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Optional
+import pandas as pd
+from src.batching import DEFAULT_BATCH_SIZE
+from src.knowledge_base import load_knowledge_base, company_categories
+from src.fast_classifier import MODES, DEFAULT_THRESHOLD
+from src.long_summary import SUMMARY_MODES, DEFAULT_CHUNK_TOKENS
+
+EVAL_DIR = "data/processed/eval"
+# Rows per task sent to a worker; also how often progress is checkpointed
+DEFAULT_CHUNK_ROWS = 16
+# Settings that must match for a run to be resumed
+RUN_KEYS = ("data", "kb_rows", "kb_fingerprint", "sample", "seed", "classification_mode",
+            "confidence_threshold", "distilled_path", "summary_mode", "chunk_tokens", "gpt", "base_url")
+
+_ENGINE = None
+
+
+def stratum_of(company: str) -> str:
+    """
+    Stratum used for sampling and per-group metrics: the category keywords of the company.
+    """
+    return company_categories(company) or "Other"
+
+
+def kb_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Hash of the ids and transcripts in row order, since checkpoints are keyed by row.
+    """
+    digest = hashlib.sha256()
+    for sim_id, text in zip(df["simulation_id"], df["full_transcript"]):
+        digest.update(f"{sim_id}\0{'' if pd.isna(text) else text}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def stratified_sample(df: pd.DataFrame, n: Optional[int], seed: int = 0, key: str = "stratum") -> pd.DataFrame:
+    """
+    Seeded sample of n rows with every stratum represented in proportion to
+    its size (at least one row each). n=None or n >= len(df) keeps every row.
+    """
+    if n is None or n >= len(df):
+        return df
+    sizes = df[key].value_counts().sort_index()
+    quotas = {s: max(1, int(round(n * count / len(df)))) for s, count in sizes.items()}
+    # Rounding can overshoot; trim the largest strata first
+    while sum(quotas.values()) > n and any(q > 1 for q in quotas.values()):
+        largest = max((s for s in quotas if quotas[s] > 1), key=lambda s: quotas[s])
+        quotas[largest] -= 1
+    parts = [group.sample(min(quotas[s], len(group)), random_state=seed) for s, group in df.groupby(key, sort=True)]
+    return pd.concat(parts).sort_index()
+
+
+def _init_worker(config: Dict, threads: int):
+    """
+    Loads one AnalysisEngine per worker process.
+    """
+    global _ENGINE
+    import torch
+    torch.set_num_threads(threads)
+    from src.analysis import AnalysisEngine
+    _ENGINE = AnalysisEngine(
+        batch_size=config["batch_size"], classification_mode=config["classification_mode"],
+        confidence_threshold=config["confidence_threshold"], distilled_path=config["distilled_path"],
+        summary_mode=config["summary_mode"], chunk_tokens=config["chunk_tokens"], gpt_cache_path=None
+    )
+
+
+def _analyze_chunk(rows: List[Dict]) -> List[Dict]:
+    start = time.perf_counter()
+    try:
+        results = _ENGINE.analyze_local_batch([row["text"] for row in rows])
+    except Exception as e:
+        results = [{"error": str(e)} for _ in rows]
+    per_row = (time.perf_counter() - start) / max(len(rows), 1)
+    return [{"row": row["row"], "local": result, "local_s": round(per_row, 4)} for row, result in zip(rows, results)]
+
+
+def load_checkpoint(path: str) -> Dict[int, Dict]:
+    """
+    Merges the checkpoint records (one JSON object per line) by row id.
+    A truncated last line from a crash is ignored.
+    """
+    records: Dict[int, Dict] = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records.setdefault(record["row"], {}).update(record)
+    return records
+
+
+def is_done(record: Dict, analyzer: str) -> bool:
+    """
+    Whether a checkpointed row has a usable result for `analyzer` ("local" or
+    "gpt"). Failed results are kept in the checkpoint but retried on resume.
+    """
+    return analyzer in record and "error" not in record[analyzer]
+
+
+class Checkpoint:
+    """
+    Append-only JSONL file; every write is flushed and fsynced so a crash
+    loses at most the chunk that was being written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, records: List[Dict]):
+        for record in records:
+            self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def run_local(rows: List[Dict], config: Dict, checkpoint: Checkpoint, workers: int, chunk_rows: int):
+    chunks = [rows[i:i + chunk_rows] for i in range(0, len(rows), chunk_rows)]
+    if not chunks:
+        return
+    threads = max(1, (os.cpu_count() or 1) // max(workers, 1))
+    done = 0
+
+    if workers <= 1:
+        _init_worker(config, threads)
+        for chunk in chunks:
+            checkpoint.write(_analyze_chunk(chunk))
+            done += len(chunk)
+            print(f"Local: {done}/{len(rows)}")
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config, threads)) as pool:
+        futures = [pool.submit(_analyze_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            results = future.result()
+            checkpoint.write(results)
+            done += len(results)
+            print(f"Local: {done}/{len(rows)}")
+
+
+def gpt_api_key(config: Dict) -> Optional[str]:
+    # A local endpoint (e.g. src.mock_openai) does not check the key
+    return os.environ.get(config["api_key_env"]) or ("local" if config["base_url"] else None)
+
+
+def run_gpt(rows: List[Dict], config: Dict, checkpoint: Checkpoint, chunk_rows: int):
+    from src.gpt_client import AsyncChatClient, analysis_prompt, gpt_response_cache
+    from src.models import CATEGORIES
+    client = AsyncChatClient(
+        gpt_api_key(config), base_url=config["base_url"],
+        max_concurrency=config["gpt_concurrency"], requests_per_minute=config["rpm"],
+        tokens_per_minute=config["tpm"], cache=gpt_response_cache(os.path.join(os.path.dirname(config["data"]), "gpt_cache.sqlite"))
+    )
+
+    async def run():
+        done = 0
+        # Checkpoint in slices so a crash keeps what has already come back
+        for i in range(0, len(rows), chunk_rows * 4):
+            part = rows[i:i + chunk_rows * 4]
+            start = time.perf_counter()
+            answers = await client.complete_json_many([analysis_prompt(row["text"], CATEGORIES) for row in part])
+            per_row = (time.perf_counter() - start) / len(part)
+            checkpoint.write([{"row": row["row"], "gpt": answer, "gpt_s": round(per_row, 4)}
+                              for row, answer in zip(part, answers)])
+            done += len(part)
+            print(f"GPT: {done}/{len(rows)}")
+
+    if rows:
+        asyncio.run(run())
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"[a-z0-9']+", (text or "").lower()))
+
+
+def _jaccard(a: str, b: str) -> float:
+    wa, wb = _words(a), _words(b)
+    return len(wa & wb) / len(wa | wb) if wa | wb else 1.0
+
+
+def _keyword_match(stratum: str, category: str) -> Optional[bool]:
+    """
+    Whether the predicted category contains one of the company's category
+    keywords (None when the company has no keyword).
+    """
+    if stratum == "Other" or not category:
+        return None
+    return any(keyword.lower() in category.lower() for keyword in stratum.split("|"))
+
+
+def compute_metrics(records: List[Dict], baseline: Optional[Dict[str, Dict]] = None) -> Dict:
+    """
+    Aggregate metrics over the merged per-row records.
+    """
+    def rate(values):
+        values = [v for v in values if v is not None]
+        return round(sum(values) / len(values), 4) if values else None
+
+    local_ok = [r for r in records if "category" in r.get("local", {})]
+    metrics = {
+        "n_rows": len(records),
+        "local_errors": len(records) - len(local_ok),
+        "local_categories": dict(Counter(r["local"]["category"] for r in local_ok)),
+        "local_mean_confidence": rate([r["local"]["confidence"] for r in local_ok]),
+        "local_mean_seconds": rate([r.get("local_s") for r in local_ok]),
+        "local_company_keyword_agreement": rate([_keyword_match(r["stratum"], r["local"]["category"]) for r in local_ok]),
+    }
+
+    gpt_done = [r for r in records if "gpt" in r]
+    if gpt_done:
+        gpt_ok = [r for r in gpt_done if "error" not in r["gpt"]]
+        both = [r for r in gpt_ok if "category" in r.get("local", {})]
+        metrics.update({
+            "gpt_errors": len(gpt_done) - len(gpt_ok),
+            "gpt_categories": dict(Counter(str(r["gpt"].get("category")) for r in gpt_ok)),
+            "gpt_mean_seconds": rate([r.get("gpt_s") for r in gpt_done]),
+            "category_agreement": rate([r["local"]["category"] == r["gpt"].get("category") for r in both]),
+            "steps_word_jaccard": rate([_jaccard(r["local"]["steps"], " ".join(map(str, r["gpt"].get("steps") or [])))
+                                        for r in both]),
+        })
+        by_stratum = defaultdict(list)
+        for r in both:
+            by_stratum[r["stratum"]].append(r["local"]["category"] == r["gpt"].get("category"))
+        metrics["category_agreement_by_stratum"] = {s: rate(v) for s, v in sorted(by_stratum.items())}
+
+    if baseline:
+        pairs = [(r, baseline[r["simulation_id"]]) for r in local_ok
+                 if r["simulation_id"] in baseline and "category" in baseline[r["simulation_id"]].get("local", {})]
+        metrics["baseline_rows"] = len(pairs)
+        metrics["baseline_category_agreement"] = rate([r["local"]["category"] == b["local"]["category"] for r, b in pairs])
+        metrics["baseline_steps_word_jaccard"] = rate([_jaccard(r["local"]["steps"], b["local"]["steps"]) for r, b in pairs])
+    return metrics
+
+
+def evaluate(config: Dict, workers: int = 1, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+             output_dir: str = None, restart: bool = False, baseline_path: str = None) -> Dict:
+    """
+    Runs (or resumes) an evaluation and writes <output_dir>/results.json with
+    the per-row results and the aggregate metrics.
+    """
+    if config["gpt"] and not gpt_api_key(config):
+        raise SystemExit(f"--gpt needs an API key in ${config['api_key_env']} (or a --base-url).")
+
+    df = load_knowledge_base(config["data"], columns=["simulation_id", "company", "full_transcript"])
+    df = df.reset_index(drop=True)
+    df["stratum"] = [stratum_of(c) for c in df["company"]]
+    config = {**config, "kb_rows": len(df), "kb_fingerprint": kb_fingerprint(df)}
+    sample = stratified_sample(df, config["sample"], config["seed"])
+
+    output_dir = output_dir or os.path.join(EVAL_DIR, f"{config['classification_mode']}_{config['summary_mode']}")
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(output_dir, "checkpoint.jsonl")
+    config_path = os.path.join(output_dir, "config.json")
+
+    if os.path.exists(config_path) and not restart:
+        with open(config_path, 'r') as f:
+            previous = json.load(f)
+        if {k: previous.get(k) for k in RUN_KEYS} != {k: config.get(k) for k in RUN_KEYS}:
+            raise SystemExit(f"{output_dir} holds a run with different settings. Use --restart or another --output-dir.")
+    elif restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    with open(config_path, 'w') as f:
+        json.dump({k: config.get(k) for k in RUN_KEYS}, f, indent=2)
+
+    done = load_checkpoint(checkpoint_path)
+    rows = [{"row": int(i), "text": text} for i, text in zip(sample.index, sample["full_transcript"])]
+    todo_local = [r for r in rows if not is_done(done.get(r["row"], {}), "local")]
+    todo_gpt = [r for r in rows if not is_done(done.get(r["row"], {}), "gpt")] if config["gpt"] else []
+    retry_local = sum("local" in done.get(r["row"], {}) for r in todo_local)
+    retry_gpt = sum("gpt" in done.get(r["row"], {}) for r in todo_gpt)
+    print(f"{len(rows)} rows selected, {len(rows) - len(todo_local)} already analyzed locally.")
+    if retry_local or retry_gpt:
+        print(f"Retrying rows that failed before: {retry_local} local, {retry_gpt} GPT.")
+
+    checkpoint = Checkpoint(checkpoint_path)
+    try:
+        run_local(todo_local, config, checkpoint, workers, chunk_rows)
+        run_gpt(todo_gpt, config, checkpoint, chunk_rows)
+    finally:
+        checkpoint.close()
+
+    merged = load_checkpoint(checkpoint_path)
+    records = []
+    for i, row in sample.iterrows():
+        record = {"row": int(i), "simulation_id": row["simulation_id"], "company": row["company"], "stratum": row["stratum"]}
+        record.update({k: v for k, v in merged.get(int(i), {}).items() if k != "row"})
+        records.append(record)
+
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, 'r') as f:
+            baseline = {r["simulation_id"]: r for r in json.load(f)["rows"]}
+
+    failed = {analyzer: [r["row"] for r in records if analyzer in r and not is_done(r, analyzer)]
+              for analyzer in ("local", "gpt")}
+    if failed["local"] or failed["gpt"]:
+        print(f"Failed rows (rerun to retry): {len(failed['local'])} local, {len(failed['gpt'])} GPT.")
+
+    report = {"config": {k: config.get(k) for k in RUN_KEYS}, "metrics": compute_metrics(records, baseline),
+              "failed_rows": failed, "rows": records}
+    results_path = os.path.join(output_dir, "results.json")
+    with open(results_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {results_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the local (and optionally GPT) analyzers over the knowledge base.")
+    parser.add_argument("--data", default="data/processed/knowledge_base.csv")
+    parser.add_argument("--sample", type=int, default=None, help="Seeded stratified sample of N rows (default: every row).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each with its own copy of the models.")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--classification-mode", choices=MODES, default="mnli")
+    parser.add_argument("--confidence-threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--distilled-path", default="data/processed/fast_classifier.pkl")
+    parser.add_argument("--summary-mode", choices=SUMMARY_MODES, default="window")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS)
+    parser.add_argument("--gpt", action="store_true", help="Also run the GPT analyzer (API key from --api-key-env).")
+    parser.add_argument("--api-key-env", default="OPENAI_API_KEY")
+    parser.add_argument("--base-url", default=None, help="Chat-completions endpoint, e.g. the local mock server.")
+    parser.add_argument("--gpt-concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=float, default=None)
+    parser.add_argument("--tpm", type=float, default=None)
+    parser.add_argument("--output-dir", default=None, help=f"Default: {EVAL_DIR}/<classification>_<summary mode>")
+    parser.add_argument("--baseline", default=None, help="results.json of another run to compare against.")
+    parser.add_argument("--restart", action="store_true", help="Discard the checkpoint instead of resuming.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data):
+        print("Data file not found! Please run data_loader.py first.")
+    else:
+        config = {
+            "data": args.data, "sample": args.sample, "seed": args.seed, "batch_size": args.batch_size,
+            "classification_mode": args.classification_mode, "confidence_threshold": args.confidence_threshold,
+            "distilled_path": args.distilled_path, "summary_mode": args.summary_mode, "chunk_tokens": args.chunk_tokens,
+            "gpt": args.gpt, "api_key_env": args.api_key_env, "base_url": args.base_url,
+            "gpt_concurrency": args.gpt_concurrency, "rpm": args.rpm, "tpm": args.tpm,
+        }
+        report = evaluate(config, args.workers, args.chunk_rows, args.output_dir, args.restart, args.baseline)
+        print(json.dumps(report["metrics"], indent=2))
@@ -0,0 +1,246 @@
+import os
+import pickle
+import argparse
+import numpy as np
+from typing import List, Dict, Optional
+from src.batching import run_batched, DEFAULT_BATCH_SIZE
+from src.models import get_classifier, model_id, CLASSIFIER_MODEL, CATEGORIES
+
+# Classification modes:
+#   "mnli"       - full zero-shot bart-large-mnli (one forward pass per label)
+#   "distilled"  - TF-IDF + logistic regression trained on MNLI's own labels,
+#                  MNLI only runs when the fast model is below the threshold
+#   "early_exit" - MNLI one label at a time in the distilled model's order,
+#                  stop as soon as one label is entailed with enough confidence;
+#                  texts that clear none of the first labels get a full MNLI pass
+MODES = ("mnli", "distilled", "early_exit")
+DEFAULT_THRESHOLD = 0.6
+# Labels tried one at a time in early_exit mode before falling back to full MNLI
+EARLY_EXIT_RANKS = 2
+DISTILLED_VERSION = 2
+
+
+class DistilledClassifier:
+    """
+    Cheap student model that imitates bart-large-mnli's zero-shot labels.
+    """
+
+    def __init__(self, labels: List[str]):
+        self.labels = list(labels)
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        self.vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2), sublinear_tf=True)
+        self.model = None
+        self.constant = None      # set when the teacher only ever produced one label
+        self.teacher = None
+
+    def fit(self, texts: List[str], teacher_labels: List[str]) -> "DistilledClassifier":
+        features = self.vectorizer.fit_transform(texts)
+        if len(set(teacher_labels)) < 2:
+            self.constant = teacher_labels[0]
+        else:
+            from sklearn.linear_model import LogisticRegression
+            self.model = LogisticRegression(max_iter=1000, class_weight='balanced')
+            self.model.fit(features, teacher_labels)
+        return self
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        """
+        (n_texts x n_labels) probabilities, columns in self.labels order.
+        """
+        probs = np.zeros((len(texts), len(self.labels)))
+        if self.constant is not None:
+            probs[:, self.labels.index(self.constant)] = 1.0
+            return probs
+        model_probs = self.model.predict_proba(self.vectorizer.transform(texts))
+        for j, label in enumerate(self.model.classes_):
+            probs[:, self.labels.index(label)] = model_probs[:, j]
+        return probs
+
+    def save(self, path: str):
+        """
+        Stores plain state (no pickled class), so the file loads no matter which
+        module trained it (e.g. `python -m src.fast_classifier --train` runs as __main__).
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        state = {"version": DISTILLED_VERSION, "labels": self.labels, "vectorizer": self.vectorizer,
+                 "model": self.model, "constant": self.constant, "teacher": self.teacher}
+        with open(path, 'wb') as f:
+            pickle.dump(state, f)
+
+    @staticmethod
+    def load(path: str, labels: List[str]) -> Optional["DistilledClassifier"]:
+        """
+        The saved classifier, or None if there is none, it cannot be read, or
+        it was trained for another version or label set.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f"Could not load the distilled classifier from {path}: {e}")
+            return None
+        if not isinstance(state, dict) or state.get("version") != DISTILLED_VERSION or state.get("labels") != list(labels):
+            print(f"Ignoring {path}: trained for another version or label set (retrain with --train).")
+            return None
+        classifier = DistilledClassifier(labels)
+        classifier.vectorizer = state["vectorizer"]
+        classifier.model = state["model"]
+        classifier.constant = state["constant"]
+        classifier.teacher = state["teacher"]
+        return classifier
+
+
+def training_windows(transcript: str, window_lines: int = 3) -> List[str]:
+    """
+    Splits a transcript into short windows of consecutive turns, which look
+    more like the short queries agents paste than a whole call does.
+    """
+    lines = [line for line in transcript.split("\n") if line.strip()]
+    windows = ["\n".join(lines[i:i + window_lines]) for i in range(0, len(lines), window_lines)]
+    return [w[:1024] for w in windows] + [transcript[:1024]]
+
+
+class IntentClassifier:
+    """
+    Returns {category, confidence} for texts using the configured mode.
+    """
+
+    def __init__(self, labels: List[str], mode: str = "mnli", threshold: float = DEFAULT_THRESHOLD,
+                 distilled: Optional[DistilledClassifier] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown classification mode: {mode} (expected one of {MODES})")
+        if mode in ("distilled", "early_exit") and distilled is None:
+            print("No distilled classifier found (run `python -m src.fast_classifier --train`). Using MNLI.")
+            mode = "mnli"
+        self.labels = list(labels)
+        self.mode = mode
+        self.threshold = threshold
+        self.distilled = distilled
+        self.batch_size = batch_size
+        self.fallbacks = 0
+
+    def classify(self, text: str) -> Dict:
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts: List[str], batch_size: int = None) -> List[Dict]:
+        results: List[Optional[Dict]] = [None] * len(texts)
+        todo = list(range(len(texts)))
+
+        if self.mode == "early_exit" and texts:
+            todo = self._early_exit(texts, results, batch_size)
+            self.fallbacks += len(todo)
+
+        if self.mode == "distilled" and texts:
+            probs = self.distilled.predict_proba(texts)
+            todo = []
+            for i, row in enumerate(probs):
+                best = int(row.argmax())
+                if row[best] >= self.threshold:
+                    results[i] = {"category": self.labels[best], "confidence": float(row[best])}
+                else:
+                    todo.append(i)
+            self.fallbacks += len(todo)
+
+        if todo:
+            for i, result in zip(todo, self._mnli([texts[i] for i in todo], batch_size)):
+                results[i] = result
+        return results
+
+    def _mnli(self, texts: List[str], batch_size: int = None) -> List[Dict]:
+        classifier = get_classifier()
+        outputs = run_batched(
+            lambda batch: classifier(batch, candidate_labels=self.labels, batch_size=len(batch)),
+            texts, batch_size or self.batch_size
+        )
+        results = []
+        for output in outputs:
+            if isinstance(output, Exception):
+                raise output
+            results.append({"category": output['labels'][0], "confidence": float(output['scores'][0])})
+        return results
+
+    def _early_exit(self, texts: List[str], results: List[Optional[Dict]],
+                    batch_size: int = None) -> List[int]:
+        """
+        Scores the distilled model's top EARLY_EXIT_RANKS labels one at a time,
+        one batched round per rank over the texts that have not exited yet.
+        A text exits at the first label whose entailment probability reaches the
+        threshold; that probability is its confidence (an independent entailment
+        score, comparable to the threshold rather than an MNLI softmax over all
+        labels). Fills results in place and returns the positions that still
+        need a full MNLI pass, whose answers then match mnli mode exactly.
+        """
+        classifier = get_classifier()
+        orders = np.argsort(-self.distilled.predict_proba(texts), axis=1, kind='stable')
+        todo = list(range(len(texts)))
+        for rank in range(min(EARLY_EXIT_RANKS, len(self.labels))):
+            remaining = []
+            for j in sorted({int(orders[i, rank]) for i in todo}):
+                group = [i for i in todo if orders[i, rank] == j]
+                outputs = run_batched(
+                    lambda batch, label=self.labels[j]: classifier(
+                        batch, candidate_labels=[label], multi_label=True, batch_size=len(batch)),
+                    [texts[i] for i in group], batch_size or self.batch_size
+                )
+                for i, output in zip(group, outputs):
+                    if isinstance(output, Exception):
+                        raise output
+                    score = float(output['scores'][0])
+                    if score >= self.threshold:
+                        results[i] = {"category": self.labels[j], "confidence": score}
+                    else:
+                        remaining.append(i)
+            todo = sorted(remaining)
+            if not todo:
+                break
+        return todo
+
+def train_distilled(transcripts: List[str], labels: List[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                    holdout: float = 0.2, seed: int = 0) -> Dict:
+    """
+    Labels knowledge base windows with bart-large-mnli and fits the student on them.
+    Returns the student and its agreement with MNLI on a held-out split.
+    """
+    texts = [w for t in transcripts if t for w in training_windows(t)]
+    print(f"Labelling {len(texts)} training windows with {CLASSIFIER_MODEL}...")
+    teacher = IntentClassifier(labels, mode="mnli", batch_size=batch_size)
+    teacher_labels = [r["category"] for r in teacher.classify_batch(texts)]
+
+    rng = np.random.RandomState(seed)
+    order = rng.permutation(len(texts))
+    n_test = int(len(texts) * holdout)
+    test_idx, train_idx = order[:n_test], order[n_test:]
+
+    student = DistilledClassifier(labels).fit([texts[i] for i in train_idx], [teacher_labels[i] for i in train_idx])
+    agreement = None
+    if n_test:
+        probs = student.predict_proba([texts[i] for i in test_idx])
+        predicted = [labels[j] for j in probs.argmax(axis=1)]
+        agreement = float(np.mean([p == teacher_labels[i] for p, i in zip(predicted, test_idx)]))
+
+    # Refit on everything for the saved model
+    student = DistilledClassifier(labels).fit(texts, teacher_labels)
+    student.teacher = model_id(CLASSIFIER_MODEL)
+    return {"classifier": student, "n_examples": len(texts), "holdout_agreement": agreement}
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Train the distilled intent classifier from MNLI labels.")
+    parser.add_argument("--train", action="store_true")
+    parser.add_argument("--data", default="data/processed/knowledge_base.csv")
+    parser.add_argument("--output", default="data/processed/fast_classifier.pkl")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.train:
+        df = pd.read_csv(args.data)
+        result = train_distilled(df['full_transcript'].fillna("").tolist(), CATEGORIES, args.batch_size)
+        result["classifier"].save(args.output)
+        print(f"Trained on {result['n_examples']} examples. Held-out agreement with MNLI: {result['holdout_agreement']}")
+        print(f"Saved to: {args.output}")
+    else:
+        parser.print_help()
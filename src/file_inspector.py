@@ -1,28 +1,339 @@
 import os
+import json
+import time
+import sqlite3
+import zipfile
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from src.data_loader import scan_entries
 
-def inspect_files(start_path="data/raw"):
+RAW_DIR = "data/raw"
+INDEX_PATH = "data/processed/raw_index.sqlite"
+INDEX_VERSION = "1"
+CHECK_CHUNK = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+-- One row per file on disk (container IS NULL, path relative to the root)
+-- and per zip member (container = the zip's path, path = '<zip>::<member>').
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    container TEXT,
+    ext TEXT,
+    size INTEGER,
+    mtime REAL,
+    crc INTEGER,
+    json_ok INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_container ON entries (container);
+CREATE INDEX IF NOT EXISTS entries_ext ON entries (ext);
+"""
+
+
+def scan_tree(start_path: str) -> Iterator[Tuple[str, int, float]]:
+    """
+    Yields (path, size, mtime) for every regular file under start_path; type
+    checks come from the os.scandir listing itself.
+    """
+    for entry in scan_entries(start_path):
+        try:
+            if entry.is_file(follow_symlinks=False):
+                st = entry.stat(follow_symlinks=False)
+                yield entry.path, st.st_size, st.st_mtime
+        except OSError:
+            continue
+
+
+def _ext(name: str) -> str:
+    return os.path.splitext(name)[1].lower()
+
+
+def _json_error(raw: bytes) -> Optional[str]:
+    try:
+        json.loads(raw.decode('utf-8-sig'))
+        return None
+    except (ValueError, UnicodeDecodeError) as e:
+        return str(e)
+
+
+def check_json_files(paths: List[str]) -> List[Tuple[str, Optional[str]]]:
+    """
+    (path, error) for each JSON file; error is None when it parses. Runs in a worker process.
+    """
+    results = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                results.append((path, _json_error(f.read())))
+        except OSError as e:
+            results.append((path, str(e)))
+    return results
+
+
+def list_zip(zip_path: str, known: Dict[str, Tuple], validate: bool = True) -> Dict:
+    """
+    Lists a zip's members from its central directory (no member is extracted).
+    JSON members are parsed only when validate is set and their CRC/size differ
+    from `known` (member -> (crc, size, json_ok, error)). Runs in a worker process.
+    """
+    result = {"zip_path": zip_path, "members": [], "parsed": 0, "error": None}
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                ext = _ext(info.filename)
+                json_ok, error = None, None
+                previous = known.get(info.filename)
+                unchecked = validate and ext == ".json" and (previous is None or previous[2] is None)
+                if previous and previous[:2] == (info.CRC, info.file_size) and not unchecked:
+                    json_ok, error = previous[2], previous[3]
+                elif validate and ext == ".json":
+                    try:
+                        error = _json_error(zf.read(info))
+                    except (zipfile.BadZipFile, OSError, RuntimeError) as e:
+                        error = str(e)
+                    json_ok = int(error is None)
+                    result["parsed"] += 1
+                result["members"].append((info.filename, ext, info.file_size, info.CRC, json_ok, error))
+    except (zipfile.BadZipFile, OSError) as e:
+        result["error"] = str(e)
+    return result
+
+
+class RawIndex:
+    """
+    Persistent inventory of the raw data tree (files on disk plus the members
+    of every zip) in SQLite.
+
+    `refresh` rescans with os.scandir but only re-reads what changed: files
+    whose size/mtime differ are re-validated and zips are re-listed, with
+    unchanged members (same CRC/size) keeping their earlier result. Other
+    tools query the index instead of walking the tree:
+
+        index = RawIndex()
+        index.refresh("data/raw")
+        for path in index.json_files():
+            ...
+    """
+
+    def __init__(self, index_path: str = INDEX_PATH):
+        self.index_path = index_path
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(index_path)
+        self._db.executescript(SCHEMA)
+        self.root = self._meta("root")
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self) -> "RawIndex":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _set_meta(self, key: str, value: str):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def refresh(self, start_path: str = RAW_DIR, workers: int = None, validate: bool = True,
+                max_pending: int = 64) -> Dict:
+        """
+        Brings the index up to date with start_path. Returns counts of new,
+        changed, removed and unchanged files and of the JSON documents parsed.
+        """
+        start = time.perf_counter()
+        root = os.path.abspath(start_path)
+        db = self._db
+        if self._meta("version") != INDEX_VERSION or self._meta("root") != root:
+            db.execute("DELETE FROM entries")
+            self._set_meta("version", INDEX_VERSION)
+            self._set_meta("root", root)
+        self.root = root
+
+        # 1. Diff the directory listing against the index inside SQLite
+        db.execute("CREATE TEMP TABLE IF NOT EXISTS scan (path TEXT PRIMARY KEY, size INTEGER, mtime REAL)")
+        db.execute("DELETE FROM scan")
+        batch = []
+        for path, size, mtime in scan_tree(start_path):
+            batch.append((os.path.relpath(path, start_path), size, mtime))
+            if len(batch) >= 10000:
+                db.executemany("INSERT INTO scan VALUES (?, ?, ?)", batch)
+                batch = []
+        db.executemany("INSERT INTO scan VALUES (?, ?, ?)", batch)
+
+        removed = [r[0] for r in db.execute(
+            "SELECT path FROM entries WHERE container IS NULL AND path NOT IN (SELECT path FROM scan)")]
+        changed = db.execute(
+            "SELECT s.path, s.size, s.mtime, e.path IS NULL FROM scan s LEFT JOIN entries e ON e.path = s.path "
+            "WHERE e.path IS NULL OR e.size != s.size OR e.mtime != s.mtime").fetchall()
+        stats = {"files": db.execute("SELECT COUNT(*) FROM scan").fetchone()[0],
+                 "new": sum(1 for row in changed if row[3]), "changed": sum(1 for row in changed if not row[3]),
+                 "removed": len(removed), "json_checked": 0, "zips_listed": 0}
+        stats["unchanged"] = stats["files"] - stats["new"] - stats["changed"]
+
+        for path in removed:
+            db.execute("DELETE FROM entries WHERE path = ? OR container = ?", (path, path))
+        db.executemany(
+            "INSERT OR REPLACE INTO entries (path, container, ext, size, mtime, crc, json_ok, error) "
+            "VALUES (?, NULL, ?, ?, ?, NULL, NULL, NULL)",
+            [(path, _ext(path), size, mtime) for path, size, mtime, _ in changed])
+        db.commit()
+
+        # 2. Work list: changed/unchecked JSON files and changed zips (or zips with unchecked members)
+        to_check = [r[0] for r in db.execute(
+            "SELECT path FROM entries WHERE container IS NULL AND ext = '.json' AND json_ok IS NULL")] if validate else []
+        zips = {path for path, _, _, _ in changed if _ext(path) == ".zip"}
+        if validate:
+            zips.update(r[0] for r in db.execute(
+                "SELECT DISTINCT container FROM entries WHERE container IS NOT NULL "
+                "AND ext = '.json' AND json_ok IS NULL"))
+
+        # 3. Parse in worker processes, writing results as they arrive
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tasks = [(list_zip, os.path.join(start_path, z), self._members(z), validate) for z in sorted(zips)]
+            tasks += [(check_json_files, [os.path.join(start_path, p) for p in to_check[i:i + CHECK_CHUNK]])
+                      for i in range(0, len(to_check), CHECK_CHUNK)]
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(*task))
+                if len(pending) >= max_pending:
+                    self._store(pending.popleft().result(), start_path, stats)
+            while pending:
+                self._store(pending.popleft().result(), start_path, stats)
+
+        self._set_meta("refreshed_at", str(time.time()))
+        db.commit()
+        stats["elapsed_s"] = round(time.perf_counter() - start, 2)
+        return stats
+
+    def _members(self, zip_rel: str) -> Dict[str, Tuple]:
+        prefix = len(zip_rel) + 2
+        return {path[prefix:]: (crc, size, json_ok, error) for path, crc, size, json_ok, error in self._db.execute(
+            "SELECT path, crc, size, json_ok, error FROM entries WHERE container = ?", (zip_rel,))}
+
+    def _store(self, result, start_path: str, stats: Dict):
+        db = self._db
+        if isinstance(result, list):
+            db.executemany("UPDATE entries SET json_ok = ?, error = ? WHERE path = ?",
+                           [(int(error is None), error, os.path.relpath(path, start_path)) for path, error in result])
+            stats["json_checked"] += len(result)
+        else:
+            zip_rel = os.path.relpath(result["zip_path"], start_path)
+            if result["error"]:
+                # Keep the previous member list rather than losing it to a half-copied zip
+                db.execute("UPDATE entries SET error = ? WHERE path = ?", (result["error"], zip_rel))
+            else:
+                db.execute("DELETE FROM entries WHERE container = ?", (zip_rel,))
+                db.executemany(
+                    "INSERT OR REPLACE INTO entries (path, container, ext, size, mtime, crc, json_ok, error) "
+                    "VALUES (?, ?, ?, ?, NULL, ?, ?, ?)",
+                    [(f"{zip_rel}::{name}", zip_rel, ext, size, crc, json_ok, error)
+                     for name, ext, size, crc, json_ok, error in result["members"]])
+                stats["json_checked"] += result["parsed"]
+            stats["zips_listed"] += 1
+        db.commit()
+
+    # --- Queries ---
+
+    def json_files(self, valid_only: bool = True, include_members: bool = False) -> Iterator[str]:
+        """
+        JSON files in the tree: absolute paths on disk, plus '<zip>::<member>'
+        entries with include_members. valid_only skips documents that failed to parse.
+        """
+        query = "SELECT path, container FROM entries WHERE ext = '.json'"
+        if not include_members:
+            query += " AND container IS NULL"
+        if valid_only:
+            query += " AND (json_ok IS NULL OR json_ok = 1)"
+        for path, container in self._db.execute(query + " ORDER BY path"):
+            yield path if container else os.path.join(self.root, path)
+
+    def zip_files(self) -> Iterator[str]:
+        """
+        Absolute paths of the readable zips at the root of the tree (the ones
+        data_loader extracts into folders of the same name).
+        """
+        for (path,) in self._db.execute("SELECT path FROM entries WHERE container IS NULL AND ext = '.zip' "
+                                        "AND error IS NULL ORDER BY path"):
+            if os.sep not in path:
+                yield os.path.join(self.root, path)
+
+    def invalid_json(self, limit: int = None) -> List[Dict]:
+        query = "SELECT path, error FROM entries WHERE json_ok = 0 ORDER BY path"
+        rows = self._db.execute(query + (f" LIMIT {int(limit)}" if limit else "")).fetchall()
+        return [{"path": path, "error": error} for path, error in rows]
+
+    def zip_members(self, zip_path: str) -> List[Dict]:
+        rows = self._db.execute("SELECT path, size, crc, json_ok FROM entries WHERE container = ? ORDER BY path",
+                                (zip_path,)).fetchall()
+        return [{"path": p.split("::", 1)[1], "size": size, "crc": crc, "json_ok": ok} for p, size, crc, ok in rows]
+
+    def summary(self) -> Dict:
+        db = self._db
+        by_ext = {}
+        for container, ext, count, size in db.execute(
+                "SELECT container IS NOT NULL, ext, COUNT(*), SUM(size) FROM entries GROUP BY 1, 2 ORDER BY 3 DESC"):
+            key = f"{ext or '(none)'}{' (in zips)' if container else ''}"
+            by_ext[key] = {"count": count, "bytes": size or 0}
+
+        def count(where: str) -> int:
+            return db.execute(f"SELECT COUNT(*) FROM entries WHERE {where}").fetchone()[0]
+
+        refreshed_at = self._meta("refreshed_at")
+        return {
+            "root": self.root,
+            "files": count("container IS NULL"),
+            "zips": count("container IS NULL AND ext = '.zip'"),
+            "zip_members": count("container IS NOT NULL"),
+            "bytes_on_disk": db.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE container IS NULL").fetchone()[0],
+            "invalid_json": count("json_ok = 0"),
+            "unchecked_json": count("ext = '.json' AND json_ok IS NULL"),
+            "corrupt_zips": count("container IS NULL AND ext = '.zip' AND error IS NOT NULL"),
+            "by_type": by_ext,
+            "refreshed_at": None if refreshed_at is None else time.strftime('%Y-%m-%d %H:%M:%S',
+                                                                           time.localtime(float(refreshed_at))),
+        }
+
+
+def inspect_files(start_path=RAW_DIR, index_path=INDEX_PATH, workers=None, validate=True):
     print(f"--- INSPECTING {start_path} ---")
-    
-    file_count = 0
-    extensions = {}
-    
-    for root, dirs, files in os.walk(start_path):
-        for file in files:
-            file_count += 1
-            
-            # Get extension
-            ext = os.path.splitext(file)[1].lower()
-            extensions[ext] = extensions.get(ext, 0) + 1
-            
-            # Print the first 20 files found to give us a sample
-            if file_count <= 20:
-                print(f"Found: {os.path.join(root, file)}")
-                
-    print("\n--- SUMMARY ---")
-    print(f"Total files found: {file_count}")
-    print("File types found:")
-    for ext, count in extensions.items():
-        print(f"  {ext}: {count}")
+
+    with RawIndex(index_path) as index:
+        stats = index.refresh(start_path, workers=workers, validate=validate)
+        print(f"Scanned {stats['files']} files in {stats['elapsed_s']}s: {stats['new']} new, {stats['changed']} changed, "
+              f"{stats['removed']} removed, {stats['unchanged']} unchanged "
+              f"({stats['zips_listed']} zips listed, {stats['json_checked']} JSON documents parsed).")
+        summary = index.summary()
+
+        print("\n--- SUMMARY ---")
+        print(f"Total files found: {summary['files']} ({summary['bytes_on_disk'] / 1e6:.1f} MB)")
+        print(f"Zip archives: {summary['zips']} ({summary['zip_members']} members, {summary['corrupt_zips']} corrupt)")
+        print(f"JSON: {summary['invalid_json']} invalid, {summary['unchecked_json']} not checked")
+        print("File types found:")
+        for ext, info in summary["by_type"].items():
+            print(f"  {ext}: {info['count']} ({info['bytes'] / 1e6:.1f} MB)")
+        for entry in index.invalid_json(limit=20):
+            print(f"  invalid: {entry['path']} ({entry['error']})")
+    return summary
+
 
 if __name__ == "__main__":
-    inspect_files()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Inventory the raw data tree (files and zip members) into a cached index.")
+    parser.add_argument("path", nargs="?", default=RAW_DIR)
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count).")
+    parser.add_argument("--no-validate", action="store_true", help="Only list files, skip the JSON parse check.")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON.")
+    args = parser.parse_args()
+
+    summary = inspect_files(args.path, args.index, args.workers, not args.no_validate)
+    if args.json:
+        print(json.dumps(summary, indent=2))
@@ -1,140 +1,252 @@
 # updated src/generator.py
 import os
-import json
-import pandas as pd
-import torch
-from transformers import pipeline
-from typing import List, Dict
+import time
+import threading
+from typing import List, Dict, Iterator
 import random
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from contextlib import nullcontext
+from src.batching import DEFAULT_BATCH_SIZE
+from src.models import (get_classifier, get_summarizer, model_id, stream_summary, CLASSIFIER_MODEL, SUMMARIZER_MODEL,
+                        CATEGORIES, SUMMARY_PARAMS)
+from src.fast_classifier import IntentClassifier, DistilledClassifier, DEFAULT_THRESHOLD
+from src.summary_cache import SummaryCache, cached_summarize, summary_key
+from src.long_summary import MapReduceSummarizer, SUMMARY_MODES, DEFAULT_CHUNK_TOKENS
+from src.knowledge_base import KnowledgeBase
+from src.retrieval import load_retriever, build_category_partitions, partition_for_category
+from src.metrics import RequestMetrics, MetricsSink, SlowRequestProfiler
+from src.result_cache import QueryResultCache
+
+# Streamed summaries are decoded greedily, so they are cached under their own key
+STREAM_SUMMARY_PARAMS = {**SUMMARY_PARAMS, "num_beams": 1}
+
+def split_steps(summary: str) -> List[str]:
+    """
+    Sentences of a summary that are long enough to be a step.
+    """
+    return [s.strip() for s in summary.split('.') if len(s) > 10]
 
 class FewShotGenerator:
-    def __init__(self, data_path: str = "data/processed/knowledge_base.csv"):
+    def __init__(self, data_path: str = "data/processed/knowledge_base.csv", category_patterns: Dict[str, str] = None,
+                 retriever: str = "tfidf", batch_size: int = DEFAULT_BATCH_SIZE,
+                 persist_summaries: bool = True, classification_mode: str = "mnli",
+                 confidence_threshold: float = DEFAULT_THRESHOLD, summary_mode: str = "window",
+                 chunk_tokens: int = DEFAULT_CHUNK_TOKENS, metrics_sinks: List[MetricsSink] = None,
+                 profiler: SlowRequestProfiler = None, result_cache: QueryResultCache = None):
         """
         Initializes the Local HuggingFace Models and Knowledge Base.
+        category_patterns maps a category keyword to a regex over 'company'
+        (defaults to retrieval.CATEGORY_PATTERNS).
+        retriever picks the retrieval backend: 'tfidf' (default) or 'dense'.
+        batch_size is the number of texts per forward pass in the *_batch methods.
+        persist_summaries keeps cached summaries in a SQLite file next to the CSV.
+        classification_mode is 'mnli' (default), 'distilled' or 'early_exit'
+        (see fast_classifier.py); confidence_threshold controls the MNLI fallback / early exit.
+        summary_mode is 'window' (default) or 'map_reduce', which summarizes the
+        whole transcript in chunks of at most chunk_tokens tokens (see long_summary.py).
+        metrics_sinks receive per-stage timings of every generate_steps call and
+        profiler captures stack samples of slow calls (see metrics.py).
+        result_cache returns earlier results for repeated queries (see result_cache.py);
+        it is cleared when the knowledge base file or the model configuration changes,
+        and a changed knowledge base file is reloaded (see reload_knowledge_base).
         """
-        print("Loading Knowledge Base...")
-        if os.path.exists(data_path):
-            self.df = pd.read_csv(data_path)
-            # Ensure text columns are strings
-            self.df['full_transcript'] = self.df['full_transcript'].fillna("")
-            self.df['company'] = self.df['company'].fillna("")
-        else:
-            self.df = pd.DataFrame(columns=["simulation_id", "company", "full_transcript"])
+        if summary_mode not in SUMMARY_MODES:
+            raise ValueError(f"Unknown summary mode: {summary_mode} (expected one of {SUMMARY_MODES})")
+        self.batch_size = batch_size
+        self.summary_mode = summary_mode
+        self.chunk_tokens = chunk_tokens
+        self.metrics_sinks = list(metrics_sinks or [])
+        self.profiler = profiler
+        self.data_path = data_path
+        self.category_patterns = category_patterns
+        self.retriever_name = retriever
+        self.confidence_threshold = confidence_threshold
+        self._reload_lock = threading.Lock()
+        self._load_knowledge_base()
+
+        # Summaries of retrieved cases, shared by every query that hits the same case
+        summary_db = os.path.join(os.path.dirname(data_path), "summary_cache.sqlite") if persist_summaries else None
+        self.summary_cache = SummaryCache(db_path=summary_db)
 
         print("Loading Local AI Models (This may take a moment)...")
+        # Models come from the shared registry, so an AnalysisEngine in the
+        # same process reuses the same weights.
         # Model 1: Categorization (Zero-Shot)
-        self.classifier = pipeline(
-            "zero-shot-classification", 
-            model="facebook/bart-large-mnli"
-        )
-        
+        get_classifier()
         # Model 2: Summarization (To extract steps)
-        self.summarizer = pipeline(
-            "summarization", 
-            model="facebook/bart-large-cnn"
-        )
+        get_summarizer()
         
-        self.categories = [
-            "Insurance Claim", 
-            "Payment Update", 
-            "Order Status", 
-            "Flight Booking", 
-            "General Inquiry"
-        ]
+        self.categories = list(CATEGORIES)
+
+        distilled = None
+        if classification_mode != "mnli":
+            distilled = DistilledClassifier.load(os.path.join(os.path.dirname(data_path), "fast_classifier.pkl"), self.categories)
+        self.intent = IntentClassifier(self.categories, classification_mode, confidence_threshold, distilled, batch_size)
+
+        self.result_cache = result_cache
+        self._bind_result_cache()
+
+    def _load_knowledge_base(self):
+        """
+        Loads the knowledge base, its category partitions and the retrieval index.
+        """
+        print("Loading Knowledge Base...")
+        # Reads the Parquet copy when available: metadata columns in memory,
+        # transcripts memory-mapped and decompressed on demand
+        kb = KnowledgeBase(self.data_path)
+
+        # Precompute category -> row ids once instead of regex filtering per request
+        partitions = build_category_partitions(kb.df['company'], self.category_patterns, kb.df.get('category'))
+
+        # Build the retrieval index once (or reuse the saved one if the CSV is unchanged)
+        retriever = None
+        if len(kb.transcripts) > 0:
+            try:
+                retriever = load_retriever(self.retriever_name, kb.transcripts,
+                                           os.path.dirname(self.data_path), kb.fingerprint)
+                for name, rows in partitions.items():
+                    if len(rows) > 0:
+                        retriever.add_partition(name, rows)
+            except Exception as e:
+                print(f"Could not build retrieval index: {e}")
+
+        # Swapped in together so concurrent requests see one consistent state
+        self.kb, self.df, self.transcripts, self.partitions, self.retriever = \
+            kb, kb.df, kb.transcripts, partitions, retriever
+
+    def _bind_result_cache(self):
+        if self.result_cache is not None:
+            self.result_cache.bind("|".join(str(part) for part in (
+                self.kb.fingerprint, self.retriever_name, model_id(CLASSIFIER_MODEL), self.intent.mode,
+                self.confidence_threshold, model_id(SUMMARIZER_MODEL), self.summary_mode, self.chunk_tokens,
+            )), self.data_path, self.reload_knowledge_base)
+
+    def reload_knowledge_base(self):
+        """
+        Re-reads the knowledge base after the file changed on disk (rebuilding
+        the partitions and the retrieval index) and re-binds the result cache
+        to the new fingerprint. The result cache calls this when it notices
+        the change; the previous state is kept if the new file cannot be loaded.
+        """
+        with self._reload_lock:
+            try:
+                self._load_knowledge_base()
+            except Exception as e:
+                print(f"Could not reload the knowledge base, keeping the previous one: {e}")
+            self._bind_result_cache()
+
+    @property
+    def classifier(self):
+        return get_classifier()
+
+    @property
+    def summarizer(self):
+        return get_summarizer()
+
+    def classify(self, user_query: str) -> Dict:
+        """
+        Classifies the user's intent: {category, confidence}.
+        Uses Bart-Large-MNLI, or the fast mode picked at construction.
+        """
+        return self.intent.classify(user_query)
 
     def get_category(self, user_query: str) -> str:
         """
         Uses Bart-Large-MNLI to classify the user's intent.
         """
-        result = self.classifier(user_query, candidate_labels=self.categories)
-        return result['labels'][0]
+        return self.classify(user_query)['category']
+
+    def get_categories(self, user_queries: List[str], batch_size: int = None) -> List[str]:
+        """
+        Batched version of get_category (results are in input order).
+        """
+        return [result['category'] for result in self.intent.classify_batch(user_queries, batch_size)]
 
     def find_best_match_transcript(self, user_query: str, category: str) -> str:
         """
-        Finds the MOST SIMILAR transcript using TF-IDF (Keyword matching).
+        Finds the MOST SIMILAR transcript using the configured retriever
+        (TF-IDF keyword matching by default).
         This fixes the 'randomness' issue.
         """
-        # 1. Filter by broad category first to narrow down the search
-        subset = pd.DataFrame()
-        
-        if "Insurance" in category:
-            subset = self.df[self.df['company'].str.contains("Insurance|Claim", case=False, na=False)]
-        elif "Payment" in category:
-            subset = self.df[self.df['company'].str.contains("Credit|Payment", case=False, na=False)]
-        elif "Flight" in category:
-            subset = self.df[self.df['company'].str.contains("Flight|Airline", case=False, na=False)]
-        elif "Order" in category:
-             subset = self.df[self.df['company'].str.contains("Order|Shipping|Retail", case=False, na=False)]
-        
-        # Fallback: If filter found nothing, search everything
-        if subset.empty:
-            subset = self.df
-            
-        if subset.empty:
+        # 1. Narrow the search to the precomputed rows for this category
+        # (falls back to every row if the category has no transcripts)
+        partition = partition_for_category(category, self.partitions)
+        rows = self.partitions[partition]
+
+        if len(rows) == 0:
             return ""
 
-        # 2. Use TF-IDF to find the specific transcript that matches user keywords
+        transcripts = self.transcripts
+
+        # 2. Score the query against the prebuilt index (no refitting per request)
         try:
-            # Create a list containing the user query + all candidate transcripts
-            documents = [user_query] + subset['full_transcript'].tolist()
-            
-            tfidf = TfidfVectorizer(stop_words='english')
-            tfidf_matrix = tfidf.fit_transform(documents)
-            
-            # Compute similarity of query (index 0) against all others
-            cosine_sim = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:])
-            
-            # Get the index of the best match
-            best_match_idx = cosine_sim.argmax()
+            best_row = self.retriever.best_match(user_query, partition=partition)
             
             # Return that specific transcript
-            return subset.iloc[best_match_idx]['full_transcript']
+            return transcripts[best_row]
             
         except Exception as e:
             print(f"Similarity search failed: {e}. Falling back to random.")
-            return subset.sample(1).iloc[0]['full_transcript']
+            return transcripts[random.choice(rows)]
 
-    def generate_steps(self, user_query: str) -> Dict:
+    def partition_sizes(self) -> Dict[str, int]:
         """
-        The Main Pipeline (Local Version):
-        1. Predict Category.
-        2. Find the BEST MATCH past case (Deterministic).
-        3. Summarize that past case to suggest steps.
+        Number of knowledge base rows searched for each category keyword.
+        """
+        return {name: len(rows) for name, rows in self.partitions.items()}
+
+    def _summary_input(self, transcript: str) -> str:
+        """
+        We focus on the middle part of the transcript where actions usually happen.
+        """
+        input_length = len(transcript)
+        start_idx = int(input_length * 0.15)
+        # Limit text to 1024 chars for the model
+        return transcript[start_idx:start_idx+1024]
+
+    def _summarize(self, texts: List[str], batch_size: int = None) -> List:
+        """
+        Runs the summarizer over length-bucketed batches, skipping cached texts.
+        Each entry is the summary text, or the exception raised for that text.
+        """
+        return cached_summarize(self.summarizer, texts, self.summary_cache, model_id(SUMMARIZER_MODEL),
+                                SUMMARY_PARAMS, batch_size or self.batch_size)
+
+    def summarize_transcripts(self, transcripts: List[str], batch_size: int = None) -> List:
+        """
+        One summary (or exception) per transcript using the configured summary mode.
+        In 'map_reduce' mode every chunk and every reduce step goes through the
+        summary cache, so a case shared by many queries is only summarized once.
+        """
+        if self.summary_mode == "map_reduce":
+            summarizer = MapReduceSummarizer(lambda texts: self._summarize(texts, batch_size),
+                                             self.summarizer.tokenizer, self.chunk_tokens)
+            return summarizer.summarize(transcripts)
+        return self._summarize([self._summary_input(t) for t in transcripts], batch_size)
+
+    def precompute_summaries(self, batch_size: int = None) -> int:
+        """
+        Summarizes every transcript in the knowledge base so online requests hit a warm cache.
+        """
+        transcripts = list(dict.fromkeys(t for t in self.transcripts if t))
+        self.summarize_transcripts(transcripts, batch_size)
+        return len(transcripts)
+
+    def _build_result(self, category: str, similar_transcript: str, generated_plan) -> Dict:
+        """
+        Turns the summary of the retrieved case into the response dict.
         """
-        
-        # 1. Identify Category
-        category = self.get_category(user_query)
-        
-        # 2. Retrieve a similar historical case
-        similar_transcript = self.find_best_match_transcript(user_query, category)
-        
-        # 3. Extract Steps/Summary using Local Summarizer
         steps_list = []
         reason = "Insufficient data."
         
         if similar_transcript:
-            try:
-                # Summarize the transcript to get the "Action Plan"
-                # We focus on the middle part of the transcript where actions usually happen
-                input_length = len(similar_transcript)
-                start_idx = int(input_length * 0.15) 
-                # Limit text to 1024 chars for the model
-                text_to_summarize = similar_transcript[start_idx:start_idx+1024]
-                
-                # Generate abstractive summary
-                summary_output = self.summarizer(text_to_summarize, max_length=150, min_length=40, do_sample=False)
-                generated_plan = summary_output[0]['summary_text']
-                
+            if isinstance(generated_plan, Exception):
+                steps_list = ["Could not extract specific steps from history."]
+                reason = f"Error in local model: {generated_plan}"
+            else:
                 # Split summary into a list based on sentences
-                raw_steps = generated_plan.split('.')
-                steps_list = [s.strip() for s in raw_steps if len(s) > 10]
+                steps_list = split_steps(generated_plan)
                 
                 reason = f"Identified as {category}. Retrieved similar case logic."
-            except Exception as e:
-                steps_list = ["Could not extract specific steps from history."]
-                reason = f"Error in local model: {e}"
         else:
             steps_list = ["No historical data found for this category."]
             reason = "No matching transcripts found in database."
@@ -143,4 +255,250 @@ class FewShotGenerator:
             "category": category,
             "reason": reason,
             "steps": steps_list
-        }
\ No newline at end of file
+        }
+
+    def _count_tokens(self, text: str) -> int:
+        tokenizer = getattr(self.summarizer, "tokenizer", None)
+        if tokenizer is None:
+            return len(text.split())
+        return len(tokenizer.encode(text))
+
+    def _record(self, metrics: RequestMetrics):
+        for sink in self.metrics_sinks:
+            try:
+                sink.record(metrics)
+            except Exception as e:
+                print(f"Metrics sink failed: {e}")
+
+    def generate_steps(self, user_query: str, include_timings: bool = False) -> Dict:
+        """
+        The Main Pipeline (Local Version):
+        1. Predict Category.
+        2. Find the BEST MATCH past case (Deterministic).
+        3. Summarize that past case to suggest steps.
+        With include_timings the result also has a 'timings' field (seconds per
+        stage, token counts, summary cache hits, size of the searched subset).
+        """
+        metrics = RequestMetrics("generate_steps")
+        cache_version = None
+        if self.result_cache is not None:
+            with metrics.stage("result_cache"):
+                cached = self.result_cache.get(user_query)
+                cache_version = self.result_cache.version
+            if cached is not None:
+                metrics.finish()
+                metrics.count("result_cache_hits", 1)
+                if include_timings or self.metrics_sinks:
+                    self._record(metrics)
+                if include_timings:
+                    cached["timings"] = metrics.as_dict()
+                return cached
+        profile = self.profiler.profile("generate_steps") if self.profiler else nullcontext()
+
+        with profile:
+            # 1. Identify Category
+            with metrics.stage("classify"):
+                category = self.get_category(user_query)
+
+            # 2. Retrieve a similar historical case
+            with metrics.stage("retrieve"):
+                similar_transcript = self.find_best_match_transcript(user_query, category)
+
+            # 3. Extract Steps/Summary using Local Summarizer
+            generated_plan = None
+            cache_hits = self.summary_cache.hits
+            if similar_transcript:
+                with metrics.stage("summarize"):
+                    generated_plan = self.summarize_transcripts([similar_transcript])[0]
+
+            with metrics.stage("postprocess"):
+                result = self._build_result(category, similar_transcript, generated_plan)
+        metrics.finish()
+        # Failed summaries are retried on the next request instead of being cached
+        if self.result_cache is not None and not isinstance(generated_plan, Exception):
+            self.result_cache.put(user_query, result, cache_version)
+
+        if not (include_timings or self.metrics_sinks):
+            return result
+
+        partition = partition_for_category(category, self.partitions)
+        metrics.labels["partition"] = partition
+        metrics.count("corpus_subset_size", len(self.partitions[partition]))
+        metrics.count("summary_cache_hits", self.summary_cache.hits - cache_hits)
+        metrics.count("query_tokens", self._count_tokens(user_query))
+        if similar_transcript:
+            summary_input = similar_transcript if self.summary_mode == "map_reduce" else self._summary_input(similar_transcript)
+            metrics.count("summary_input_tokens", self._count_tokens(summary_input))
+        if isinstance(generated_plan, str):
+            metrics.count("summary_tokens", self._count_tokens(generated_plan))
+
+        self._record(metrics)
+        if include_timings:
+            result["timings"] = metrics.as_dict()
+        return result
+
+    def _stream_plan(self, transcript: str) -> Iterator[str]:
+        """
+        Summary of the retrieved case in pieces: a cached summary comes out in
+        one piece, otherwise it streams from the model and is cached afterwards.
+        map_reduce mode summarizes chunks in batches, so it yields one piece too.
+        """
+        if self.summary_mode == "map_reduce":
+            plan = self.summarize_transcripts([transcript])[0]
+            if isinstance(plan, Exception):
+                raise plan
+            yield plan
+            return
+
+        text = self._summary_input(transcript)
+        model = model_id(SUMMARIZER_MODEL)
+        for params in (SUMMARY_PARAMS, STREAM_SUMMARY_PARAMS):
+            cached = self.summary_cache.get(summary_key(text, model, params))
+            if cached is not None:
+                yield cached
+                return
+
+        pieces = []
+        for piece in stream_summary(self.summarizer, text, SUMMARY_PARAMS["max_length"], SUMMARY_PARAMS["min_length"]):
+            pieces.append(piece)
+            yield piece
+        self.summary_cache.put(summary_key(text, model, STREAM_SUMMARY_PARAMS), "".join(pieces))
+
+    def generate_steps_stream(self, user_query: str, include_timings: bool = False) -> Iterator[Dict]:
+        """
+        Streaming version of generate_steps for live display. Yields events as
+        soon as they are known:
+          {"type": "category", "category": ...}      after classification
+          {"type": "token", "text": ...}             pieces of the summary while it is generated
+          {"type": "step", "index": i, "step": ...}  each step once its sentence is complete
+          {"type": "error", "error": ...}            the summarizer failed: discard the tokens and
+                                                     steps so far, fallback steps follow from index 0
+          {"type": "result", "result": {...}}        the generate_steps result (with 'timings')
+        The summary is decoded greedily so it can stream (see models.stream_summary).
+        """
+        started = time.perf_counter()
+        metrics = RequestMetrics("generate_steps_stream")
+        cache_version = None
+        if self.result_cache is not None:
+            with metrics.stage("result_cache"):
+                cached = self.result_cache.get(user_query)
+                cache_version = self.result_cache.version
+            if cached is not None:
+                yield {"type": "category", "category": cached["category"]}
+                for i, step in enumerate(cached["steps"]):
+                    yield {"type": "step", "index": i, "step": step}
+                metrics.finish()
+                metrics.count("result_cache_hits", 1)
+                if include_timings or self.metrics_sinks:
+                    self._record(metrics)
+                if include_timings:
+                    cached["timings"] = metrics.as_dict()
+                yield {"type": "result", "result": cached}
+                return
+
+        profile = self.profiler.profile("generate_steps_stream") if self.profiler else nullcontext()
+
+        with profile:
+            with metrics.stage("classify"):
+                category = self.get_category(user_query)
+            yield {"type": "category", "category": category}
+
+            with metrics.stage("retrieve"):
+                similar_transcript = self.find_best_match_transcript(user_query, category)
+
+            # Stage time includes the consumer's handling of each event
+            generated_plan, text, emitted = None, "", 0
+            if similar_transcript:
+                with metrics.stage("summarize"):
+                    try:
+                        for piece in self._stream_plan(similar_transcript):
+                            if not text:
+                                metrics.count("first_token_s", round(time.perf_counter() - started, 6))
+                            text += piece
+                            yield {"type": "token", "text": piece}
+                            # Everything before the last '.' is made of complete sentences
+                            complete = split_steps(text[:text.rfind('.') + 1])
+                            for i in range(emitted, len(complete)):
+                                yield {"type": "step", "index": i, "step": complete[i]}
+                            emitted = max(emitted, len(complete))
+                        generated_plan = text
+                    except Exception as e:
+                        generated_plan = e
+                        # Tokens and steps streamed so far are void; the fallback steps follow from index 0
+                        yield {"type": "error", "error": str(e)}
+                        emitted = 0
+
+            with metrics.stage("postprocess"):
+                result = self._build_result(category, similar_transcript, generated_plan)
+            # Steps only known at the end: the last sentence (no trailing '.') or fallback messages
+            for i in range(emitted, len(result["steps"])):
+                yield {"type": "step", "index": i, "step": result["steps"][i]}
+        metrics.finish()
+
+        if self.result_cache is not None and not isinstance(generated_plan, Exception):
+            self.result_cache.put(user_query, result, cache_version)
+        if include_timings or self.metrics_sinks:
+            metrics.labels["partition"] = partition_for_category(category, self.partitions)
+            self._record(metrics)
+            if include_timings:
+                result["timings"] = metrics.as_dict()
+        yield {"type": "result", "result": result}
+
+    def generate_steps_batch(self, user_queries: List[str], batch_size: int = None,
+                             include_timings: bool = False) -> List[Dict]:
+        """
+        Same pipeline as generate_steps for many queries at once.
+        Classification and summarization run over padded, length-bucketed
+        batches; results are returned in input order. Queries found in the
+        result cache skip the pipeline.
+        With include_timings every result gets the 'timings' of the whole batch.
+        """
+        if not user_queries:
+            return []
+
+        metrics = RequestMetrics("generate_steps_batch")
+        cache_hits = self.summary_cache.hits
+
+        # 0. Repeated queries are answered from the result cache
+        results = [None] * len(user_queries)
+        cache_version = None
+        if self.result_cache is not None:
+            with metrics.stage("result_cache"):
+                results = [self.result_cache.get(q) for q in user_queries]
+                cache_version = self.result_cache.version
+        pending = [i for i, result in enumerate(results) if result is None]
+        queries = [user_queries[i] for i in pending]
+        distinct = []
+
+        if queries:
+            # 1. Classify every query in batches
+            with metrics.stage("classify"):
+                categories = self.get_categories(queries, batch_size)
+
+            # 2. Retrieval is cheap, do it per query
+            with metrics.stage("retrieve"):
+                transcripts = [self.find_best_match_transcript(q, c) for q, c in zip(queries, categories)]
+
+            # 3. Summarize each distinct retrieved case once
+            with metrics.stage("summarize"):
+                distinct = list(dict.fromkeys(t for t in transcripts if t))
+                summaries = dict(zip(distinct, self.summarize_transcripts(distinct, batch_size)))
+
+            with metrics.stage("postprocess"):
+                for i, query, category, transcript in zip(pending, queries, categories, transcripts):
+                    plan = summaries[transcript] if transcript else None
+                    results[i] = self._build_result(category, transcript, plan)
+                    if self.result_cache is not None and not isinstance(plan, Exception):
+                        self.result_cache.put(query, results[i], cache_version)
+        metrics.finish()
+
+        if include_timings or self.metrics_sinks:
+            metrics.count("batch_size", len(user_queries))
+            metrics.count("distinct_cases", len(distinct))
+            metrics.count("result_cache_hits", len(user_queries) - len(queries))
+            metrics.count("summary_cache_hits", self.summary_cache.hits - cache_hits)
+            self._record(metrics)
+            if include_timings:
+                for result in results:
+                    result["timings"] = metrics.as_dict()
+        return results
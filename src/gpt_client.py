@@ -0,0 +1,256 @@
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import List, Dict, Optional
+from src.summary_cache import SummaryCache
+
+GPT_MODEL = "gpt-4o-mini"
+# Rough size of a JSON answer, used to reserve tokens before the response is known
+COMPLETION_TOKENS_ESTIMATE = 300
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+# Table of the SQLite cache file holding GPT answers (kept apart from summaries)
+GPT_CACHE_TABLE = "gpt_responses"
+
+
+def analysis_prompt(text: str, labels: List[str]) -> str:
+    return f"""
+        Analyze this customer service transcript:
+        "{text[:2000]}"
+
+        1. Categorize into one of: {labels}
+        2. Extract the exact steps taken by the agent.
+
+        Return JSON: {{ "category": "...", "steps": ["step1", "step2"] }}
+        """
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    ~4 characters per token for English text; good enough for rate limiting.
+    """
+    return max(1, len(text) // 4)
+
+
+def prompt_key(prompt: str, model: str, base_url: Optional[str] = None) -> str:
+    """
+    Content address of a GPT response: hash of (endpoint, model, prompt, response format).
+    The endpoint is part of the key so answers from a mock server are never
+    replayed for the real API.
+    """
+    payload = json.dumps({"endpoint": (base_url or DEFAULT_BASE_URL).rstrip("/"), "model": model,
+                          "prompt": prompt, "response_format": "json_object"}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def gpt_response_cache(db_path: Optional[str]) -> SummaryCache:
+    return SummaryCache(db_path=db_path, table=GPT_CACHE_TABLE)
+
+
+class RateLimiter:
+    """
+    Token buckets for requests per minute and tokens per minute (either can be None).
+    Waiters are served in arrival order.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = requests_per_minute or 0.0
+        self._tokens = tokens_per_minute or 0.0
+        self._last = time.monotonic()
+        self._lock = None
+        self._loop = None
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests_per_minute and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+        return wait
+
+    async def acquire(self, tokens: int = 0):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # asyncio locks belong to one event loop
+            self._lock, self._loop = asyncio.Lock(), loop
+        # A single request larger than the whole budget still has to go through
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = self._wait_time(tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests_per_minute:
+                self._requests -= 1
+            if self.tokens_per_minute:
+                self._tokens -= tokens
+
+    def refund(self, tokens: int):
+        """
+        Returns over-reserved tokens once the real usage is known.
+        """
+        if self.tokens_per_minute and tokens > 0:
+            self._tokens = min(self.tokens_per_minute, self._tokens + tokens)
+
+
+def is_retryable(error: Exception) -> bool:
+    import openai
+    return isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class AsyncChatClient:
+    """
+    Shared asyncio client for JSON chat completions.
+
+    - one pooled AsyncOpenAI (HTTP keep-alive) per event loop
+    - at most max_concurrency requests in flight
+    - request / token rate limiting (RateLimiter)
+    - exponential backoff with jitter on 429, 5xx and connection errors
+      (Retry-After is honoured when the server sends it)
+    - responses cached by endpoint and prompt hash in `cache` (see gpt_response_cache)
+    """
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, model: str = GPT_MODEL,
+                 max_concurrency: int = DEFAULT_CONCURRENCY, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff: float = 0.5, timeout: float = 60.0, cache: Optional[SummaryCache] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.retries = 0
+        self.failures = 0
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            from openai import AsyncOpenAI
+            # Retries are handled here so they share the rate limiter
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                       max_retries=0, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+
+    async def complete_json(self, prompt: str) -> Dict:
+        """
+        Parsed JSON answer for one prompt, or {"error": ...} after the last retry.
+        """
+        key = prompt_key(prompt, self.model, self.base_url)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return json.loads(cached)
+
+        self._bind()
+        reserved = estimate_tokens(prompt) + COMPLETION_TOKENS_ESTIMATE
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire(reserved)
+                try:
+                    response = await self._client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        response_format={"type": "json_object"}
+                    )
+                    if response.usage is not None:
+                        self.limiter.refund(reserved - response.usage.total_tokens)
+                    result = json.loads(response.choices[0].message.content)
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        self.failures += 1
+                        return {"error": str(e)}
+                    self.retries += 1
+                    delay = retry_after(e)
+                    if delay is None:
+                        delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                    await asyncio.sleep(delay)
+
+        if self.cache is not None:
+            self.cache.put(key, json.dumps(result))
+        return result
+
+    async def complete_json_many(self, prompts: List[str]) -> List[Dict]:
+        """
+        Runs all prompts concurrently (bounded by max_concurrency); results in input order.
+        """
+        return list(await asyncio.gather(*(self.complete_json(p) for p in prompts)))
+
+    def stats(self) -> Dict:
+        stats = {"retries": self.retries, "failures": self.failures}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+
+if __name__ == "__main__":
+    from src.mock_openai import MockChatServer
+    from src.knowledge_base import load_knowledge_base
+
+    parser = argparse.ArgumentParser(description="Throughput of the async GPT path against the local mock server.")
+    parser.add_argument("--data", default="data/processed/knowledge_base.csv")
+    parser.add_argument("--n", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=None)
+    parser.add_argument("--tpm", type=float, default=None)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock server latency per request (seconds).")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="Share of mock requests answered with 429/500.")
+    args = parser.parse_args()
+
+    from src.models import CATEGORIES
+    texts = load_knowledge_base(args.data, columns=["full_transcript"])['full_transcript'].tolist()
+    texts = (texts or ["AGENT: How can I help you today?"])
+    prompts = [analysis_prompt(f"[{i}] " + texts[i % len(texts)], CATEGORIES) for i in range(args.n)]
+
+    with MockChatServer(latency=args.latency, failure_rate=args.failure_rate) as server:
+        client = AsyncChatClient("mock-key", base_url=server.base_url, max_concurrency=args.concurrency,
+                                 requests_per_minute=args.rpm, tokens_per_minute=args.tpm, backoff=0.05)
+        start = time.perf_counter()
+        results = asyncio.run(client.complete_json_many(prompts))
+        elapsed = time.perf_counter() - start
+
+        report = {
+            "requests": len(prompts),
+            "errors": sum("error" in r for r in results),
+            "seconds": round(elapsed, 3),
+            "requests_per_s": round(len(prompts) / elapsed, 2),
+            **client.stats(),
+            "server": server.stats(),
+        }
+    print(json.dumps(report, indent=2))
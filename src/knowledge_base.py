@@ -0,0 +1,240 @@
+import os
+import re
+import bisect
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import List, Dict, Optional, Iterator, TYPE_CHECKING
+from src.data_loader import file_sha256
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Predicted category keyword -> regex over the 'company' column.
+# Checked in order; the first keyword found in the category name wins.
+CATEGORY_PATTERNS = {
+    "Insurance": "Insurance|Claim",
+    "Payment": "Credit|Payment",
+    "Flight": "Flight|Airline",
+    "Order": "Order|Shipping|Retail",
+}
+
+# Rows per Parquet row group; also the unit in which transcripts are read back
+ROW_GROUP_SIZE = 1024
+
+TEXT_COLUMNS = ["simulation_id", "company", "full_transcript"]
+
+
+def parquet_path_for(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def company_categories(company: str, patterns: Dict[str, str] = None) -> str:
+    """
+    Category keywords whose pattern matches the company, joined with '|'.
+    """
+    patterns = CATEGORY_PATTERNS if patterns is None else patterns
+    return "|".join(k for k, p in patterns.items() if re.search(p, company or "", flags=re.IGNORECASE))
+
+
+def export_parquet(csv_path: str, parquet_path: str = None) -> str:
+    """
+    Streams the CSV knowledge base into a zstd-compressed Parquet file with
+    precomputed metadata columns (transcript_length, category).
+
+    The CSV fingerprint and size/mtime are stored in the file metadata, so
+    readers can tell whether the Parquet copy is stale without hashing anything.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    parquet_path = parquet_path or parquet_path_for(csv_path)
+    st = os.stat(csv_path)
+    metadata = {
+        b"kb_fingerprint": file_sha256(csv_path).encode(),
+        b"source_size": str(st.st_size).encode(),
+        b"source_mtime": repr(st.st_mtime).encode(),
+    }
+
+    with open(csv_path, 'rb') as f:
+        header = f.readline().decode('utf-8-sig').strip().split(",")
+    reader = pacsv.open_csv(
+        csv_path,
+        read_options=pacsv.ReadOptions(block_size=16 << 20),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(column_types={c: pa.string() for c in header}),
+    )
+
+    category_cache: Dict[str, str] = {}
+    tmp_path = parquet_path + ".tmp"
+    writer = None
+    try:
+        for batch in reader:
+            table = pa.Table.from_batches([batch])
+            companies = table.column("company").to_pylist()
+            categories = []
+            for company in companies:
+                if company not in category_cache:
+                    category_cache[company] = company_categories(company)
+                categories.append(category_cache[company])
+            table = table.append_column("transcript_length", pc.utf8_length(pc.fill_null(table.column("full_transcript"), "")))
+            table = table.append_column("category", pa.array(categories, type=pa.string()))
+
+            if writer is None:
+                schema = table.schema.with_metadata(metadata)
+                writer = pq.ParquetWriter(tmp_path, schema, compression='zstd')
+            writer.write_table(table.cast(writer.schema), row_group_size=ROW_GROUP_SIZE)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        return None
+    os.replace(tmp_path, parquet_path)
+    return parquet_path
+
+
+def open_parquet(csv_path: str):
+    """
+    Opens the memory-mapped Parquet copy of the CSV, or returns None if it is
+    missing, stale (CSV size/mtime changed) or pyarrow is not installed.
+    """
+    parquet_path = parquet_path_for(csv_path)
+    if not os.path.exists(parquet_path):
+        return None
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+
+    parquet_file = pq.ParquetFile(parquet_path, memory_map=True)
+    metadata = parquet_file.schema_arrow.metadata or {}
+    if b"kb_fingerprint" not in metadata:
+        return None
+    if os.path.exists(csv_path):
+        st = os.stat(csv_path)
+        if (metadata.get(b"source_size") != str(st.st_size).encode()
+                or metadata.get(b"source_mtime") != repr(st.st_mtime).encode()):
+            print("Parquet knowledge base is older than the CSV, reading the CSV instead.")
+            return None
+    return parquet_file
+
+
+class TranscriptColumn(Sequence):
+    """
+    Lazy, read-only list of transcripts backed by a memory-mapped Parquet file.
+    Only the row groups that are actually accessed get decompressed.
+    """
+
+    def __init__(self, parquet_file, cached_groups: int = 8):
+        self._file = parquet_file
+        meta = parquet_file.metadata
+        self._starts = []
+        total = 0
+        for g in range(meta.num_row_groups):
+            self._starts.append(total)
+            total += meta.row_group(g).num_rows
+        self._len = total
+        self._cache: "OrderedDict[int, List[str]]" = OrderedDict()
+        self._cached_groups = cached_groups
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._len
+
+    def _group(self, g: int) -> List[str]:
+        with self._lock:
+            values = self._cache.get(g)
+            if values is None:
+                column = self._file.read_row_group(g, columns=["full_transcript"]).column(0)
+                values = [v or "" for v in column.to_pylist()]
+                self._cache[g] = values
+                while len(self._cache) > self._cached_groups:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(g)
+            return values
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._len))]
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError(i)
+        g = bisect.bisect_right(self._starts, i) - 1
+        return self._group(g)[i - self._starts[g]]
+
+    def __iter__(self) -> Iterator[str]:
+        # Streams group by group without filling the cache
+        for g in range(len(self._starts)):
+            column = self._file.read_row_group(g, columns=["full_transcript"]).column(0)
+            for value in column.to_pylist():
+                yield value or ""
+
+
+class KnowledgeBase:
+    """
+    Read-only view of the knowledge base.
+
+    Uses the Parquet copy when it exists and is not older than the CSV:
+    light columns (company, category, ...) are loaded into a DataFrame and the
+    transcripts stay on disk behind a lazy TranscriptColumn. Otherwise the CSV
+    is read as before.
+    """
+
+    def __init__(self, csv_path: str = "data/processed/knowledge_base.csv",
+                 columns: Optional[List[str]] = None):
+        self.csv_path = csv_path
+        self.parquet_path = parquet_path_for(csv_path)
+        self.fingerprint = None
+        import pandas as pd
+        columns = columns or ["simulation_id", "company", "category", "transcript_length"]
+
+        parquet_file = open_parquet(csv_path)
+        if parquet_file is not None:
+            self.source = self.parquet_path
+            self.fingerprint = parquet_file.schema_arrow.metadata[b"kb_fingerprint"].decode()
+            available = [c for c in columns if c in parquet_file.schema_arrow.names]
+            self.df = parquet_file.read(columns=available).to_pandas()
+            self.transcripts = TranscriptColumn(parquet_file)
+        elif os.path.exists(csv_path):
+            self.source = csv_path
+            self.fingerprint = file_sha256(csv_path)
+            df = pd.read_csv(csv_path)
+            self.transcripts = df['full_transcript'].fillna("").tolist()
+            self.df = df.drop(columns=['full_transcript'])
+        else:
+            self.source = None
+            self.transcripts = []
+            self.df = pd.DataFrame(columns=["simulation_id", "company"])
+
+        # Ensure text columns are strings
+        if 'company' in self.df.columns:
+            self.df['company'] = self.df['company'].fillna("")
+
+    def __len__(self):
+        return len(self.transcripts)
+
+
+def load_knowledge_base(csv_path: str = "data/processed/knowledge_base.csv",
+                        columns: Optional[List[str]] = None) -> "pd.DataFrame":
+    """
+    Loads only the requested columns, from Parquet when available.
+    """
+    import pandas as pd
+    columns = columns or TEXT_COLUMNS
+    parquet_file = open_parquet(csv_path)
+    if parquet_file is not None:
+        available = [c for c in columns if c in parquet_file.schema_arrow.names]
+        df = parquet_file.read(columns=available).to_pandas()
+    elif os.path.exists(csv_path):
+        df = pd.read_csv(csv_path, usecols=lambda c: c in columns)
+    else:
+        return pd.DataFrame(columns=columns)
+    for column in ('full_transcript', 'company'):
+        if column in df.columns:
+            df[column] = df[column].fillna("")
+    return df
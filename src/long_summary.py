@@ -0,0 +1,196 @@
+from typing import List, Callable, Optional
+
+# Summary modes:
+#   "window"     - one summary of a 1024-char window starting at 15% of the transcript
+#   "map_reduce" - summaries of every turn-aligned chunk, then a summary of those
+SUMMARY_MODES = ("window", "map_reduce")
+# bart-large-cnn reads at most 1024 tokens; leave room for special tokens
+DEFAULT_CHUNK_TOKENS = 900
+# Safety net for the reduce step: never recurse deeper than this
+MAX_REDUCE_ROUNDS = 4
+
+
+def split_turns(transcript: str) -> List[str]:
+    """
+    One entry per speaker turn ("SPEAKER: text" lines written by data_loader).
+    """
+    return [line.strip() for line in transcript.split("\n") if line.strip()]
+
+
+def chunk_turns(turns: List[str], count_tokens: Callable[[str], int],
+                max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[str]:
+    """
+    Greedily packs whole speaker turns into chunks of at most max_tokens.
+    A single turn longer than max_tokens is split on sentence boundaries
+    (or hard-split by words if one sentence is still too long).
+    """
+    chunks = []
+    current, current_tokens = [], 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("\n".join(current))
+        current, current_tokens = [], 0
+
+    for turn in turns:
+        n_tokens = count_tokens(turn)
+        if n_tokens > max_tokens:
+            flush()
+            chunks.extend(_split_long_text(turn, count_tokens, max_tokens))
+            continue
+        # +1 for the newline joining turns
+        if current and current_tokens + n_tokens + 1 > max_tokens:
+            flush()
+        current.append(turn)
+        current_tokens += n_tokens + 1
+    flush()
+    return chunks
+
+
+def _split_long_text(text: str, count_tokens: Callable[[str], int], max_tokens: int) -> List[str]:
+    """
+    Splits text into parts of at most max_tokens: on sentences, then words,
+    then (for a single huge word, e.g. a URL) in halves. Any piece that is
+    still too long is split again at the next level.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    pieces = [p.strip() + "." for p in text.split(".") if p.strip()]
+    if len(pieces) <= 1:
+        pieces = text.split()
+    if len(pieces) <= 1:
+        mid = len(text) // 2
+        if mid == 0:
+            # One character over the budget: nothing left to split
+            return [text]
+        return _split_long_text(text[:mid], count_tokens, max_tokens) + \
+            _split_long_text(text[mid:], count_tokens, max_tokens)
+
+    parts, current = [], ""
+    for piece in pieces:
+        if count_tokens(piece) > max_tokens:
+            if current:
+                parts.append(current)
+            parts.extend(_split_long_text(piece, count_tokens, max_tokens))
+            current = ""
+            continue
+        candidate = f"{current} {piece}".strip()
+        if current and count_tokens(candidate) > max_tokens:
+            parts.append(current)
+            current = piece
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+def check_chunking(count_tokens: Callable[[str], int], max_tokens: int) -> int:
+    """
+    Self-check: chunk_turns keeps every chunk within max_tokens on hostile
+    inputs (one long turn, one long sentence, one long word). Returns the
+    number of chunks checked; raises AssertionError on a violation.
+    """
+    word = "lorem"
+    cases = [
+        [f"AGENT: {word}. " * (max_tokens * 2)],
+        [f"CUSTOMER: {' '.join([word] * (max_tokens * 3))}"],
+        ["CUSTOMER: https://example.com/" + "x" * (max_tokens * 20)],
+        ["AGENT: Hello.", f"CUSTOMER: {' '.join([word] * max_tokens)}. Thanks.", "AGENT: Bye."],
+    ]
+    checked = 0
+    for turns in cases:
+        chunks = chunk_turns(turns, count_tokens, max_tokens)
+        assert chunks, "no chunks produced"
+        for chunk in chunks:
+            assert count_tokens(chunk) <= max_tokens, f"chunk of {count_tokens(chunk)} tokens > {max_tokens}"
+        checked += len(chunks)
+    return checked
+
+
+class MapReduceSummarizer:
+    """
+    Full-coverage summaries for long transcripts.
+
+    1. Map: split each transcript into token-bounded chunks on speaker turns
+       and summarize ALL chunks (of all transcripts) in one batched pass.
+    2. Reduce: join the chunk summaries of each transcript and summarize them
+       again, repeating while the joined text is still longer than one chunk.
+
+    summarize_fn(texts) must return one summary (or exception) per text; the
+    generator passes its cached summarizer, so chunk summaries are reused.
+    """
+
+    def __init__(self, summarize_fn: Callable[[List[str]], List], tokenizer,
+                 chunk_tokens: int = DEFAULT_CHUNK_TOKENS):
+        self.summarize_fn = summarize_fn
+        self.tokenizer = tokenizer
+        self.chunk_tokens = chunk_tokens
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def chunks(self, transcript: str) -> List[str]:
+        return chunk_turns(split_turns(transcript), self.count_tokens, self.chunk_tokens)
+
+    def summarize(self, transcripts: List[str]) -> List:
+        """
+        One summary (or the exception that prevented it) per transcript, in input order.
+        """
+        pending = [self.chunks(t) for t in transcripts]
+        results: List[Optional[object]] = [None] * len(transcripts)
+
+        for _ in range(MAX_REDUCE_ROUNDS):
+            todo = [i for i, chunks in enumerate(pending) if chunks is not None]
+            if not todo:
+                break
+
+            # One batched pass over every chunk of every unfinished transcript
+            flat = [chunk for i in todo for chunk in pending[i]]
+            summaries = self.summarize_fn(flat) if flat else []
+
+            pos = 0
+            for i in todo:
+                n_chunks = len(pending[i])
+                chunk_summaries = [s for s in summaries[pos:pos + n_chunks] if not isinstance(s, Exception)]
+                errors = [s for s in summaries[pos:pos + n_chunks] if isinstance(s, Exception)]
+                pos += n_chunks
+
+                if n_chunks == 0:
+                    results[i], pending[i] = "", None
+                elif not chunk_summaries:
+                    results[i], pending[i] = errors[0], None
+                elif len(chunk_summaries) == 1:
+                    results[i], pending[i] = chunk_summaries[0], None
+                else:
+                    # Summarize the summaries in the next round
+                    joined = "\n".join(chunk_summaries)
+                    pending[i] = [joined] if self.count_tokens(joined) <= self.chunk_tokens else \
+                        chunk_turns(chunk_summaries, self.count_tokens, self.chunk_tokens)
+
+        for i, chunks in enumerate(pending):
+            if chunks is not None:
+                # Still too long after MAX_REDUCE_ROUNDS: keep the partial summaries
+                results[i] = " ".join(chunks)
+        return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Check that map-reduce chunks stay within the token budget.")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS)
+    parser.add_argument("--tokenizer", action="store_true",
+                        help="Count tokens with the summarizer's tokenizer instead of the ~4 chars/token estimate.")
+    args = parser.parse_args()
+
+    count = lambda text: max(1, (len(text) + 3) // 4)
+    if args.tokenizer:
+        from src.models import get_summarizer
+        tokenizer = get_summarizer().tokenizer
+        count = lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+    for max_tokens in sorted({8, 64, args.chunk_tokens}):
+        print(f"chunk_tokens={max_tokens}: {check_chunking(count, max_tokens)} chunks within budget")
@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Optional
+
+# Latency histogram buckets (seconds) for the Prometheus sink
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class RequestMetrics:
+    """
+    Per-request measurements: wall time per stage plus free-form counters
+    (token counts, cache hits, corpus subset size, ...).
+    """
+
+    def __init__(self, name: str = "generate_steps"):
+        self.name = name
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, float] = {}
+        self.labels: Dict[str, str] = {}
+        self._start = time.perf_counter()
+        self.total = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, value: float):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def finish(self) -> "RequestMetrics":
+        self.total = time.perf_counter() - self._start
+        return self
+
+    def as_dict(self) -> Dict:
+        return {
+            "total_s": round(self.total if self.total is not None else time.perf_counter() - self._start, 6),
+            "stages_s": {k: round(v, 6) for k, v in self.stages.items()},
+            **self.counts,
+            **self.labels,
+        }
+
+
+class MetricsSink:
+    """
+    Receives the metrics of every finished request.
+    """
+
+    def record(self, metrics: RequestMetrics):
+        raise NotImplementedError
+
+
+class JsonLinesSink(MetricsSink):
+    """
+    One JSON object per request, appended to a file (or written to a stream).
+    """
+
+    def __init__(self, path: Optional[str] = None, stream=None):
+        self._lock = threading.Lock()
+        self._stream = stream
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._stream = open(path, 'a', encoding='utf-8')
+        elif stream is None:
+            self._stream = sys.stdout
+
+    def record(self, metrics: RequestMetrics):
+        line = json.dumps({"ts": round(time.time(), 3), "request": metrics.name, **metrics.as_dict()})
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+
+class PrometheusSink(MetricsSink):
+    """
+    Aggregates request metrics in memory and renders them in the Prometheus
+    text format; serve(port) exposes them on http://host:port/metrics.
+    """
+
+    def __init__(self, prefix: str = "symtrain"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self._sums = Counter()
+        self._counts = Counter()
+        self._totals = Counter()
+        self._gauges: Dict[str, float] = {}
+        self._server = None
+
+    def record(self, metrics: RequestMetrics):
+        stages = dict(metrics.stages)
+        stages["total"] = metrics.total if metrics.total is not None else sum(stages.values())
+        with self._lock:
+            self._requests[metrics.name] += 1
+            for stage, seconds in stages.items():
+                key = (metrics.name, stage)
+                self._sums[key] += seconds
+                self._counts[key] += 1
+                buckets = self._buckets[key]
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if seconds <= bound:
+                        buckets[i] += 1
+            for name, value in metrics.counts.items():
+                self._totals[(metrics.name, name)] += value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def render(self) -> str:
+        p = self.prefix
+        lines = [f"# TYPE {p}_requests_total counter"]
+        with self._lock:
+            for request, n in sorted(self._requests.items()):
+                lines.append(f'{p}_requests_total{{request="{request}"}} {n}')
+
+            lines.append(f"# TYPE {p}_stage_seconds histogram")
+            for (request, stage), buckets in sorted(self._buckets.items()):
+                labels = f'request="{request}",stage="{stage}"'
+                for bound, n in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f'{p}_stage_seconds_bucket{{{labels},le="{bound}"}} {n}')
+                lines.append(f'{p}_stage_seconds_bucket{{{labels},le="+Inf"}} {self._counts[(request, stage)]}')
+                lines.append(f'{p}_stage_seconds_sum{{{labels}}} {self._sums[(request, stage)]:.6f}')
+                lines.append(f'{p}_stage_seconds_count{{{labels}}} {self._counts[(request, stage)]}')
+
+            lines.append(f"# TYPE {p}_request_counts_total counter")
+            for (request, name), value in sorted(self._totals.items()):
+                lines.append(f'{p}_request_counts_total{{request="{request}",name="{name}"}} {value}')
+
+            for name, value in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {p}_{name} gauge")
+                lines.append(f"{p}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0"):
+        """
+        Starts a background HTTP server for /metrics (once per sink).
+        """
+        if self._server is not None:
+            return self._server
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = sink.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler for slow requests. While a request runs, a background
+    thread samples the request thread's stack every `interval` seconds; if the
+    request took longer than `threshold_s`, the samples are written to
+    `output_dir` in collapsed-stack format (flamegraph.pl / speedscope).
+    """
+
+    def __init__(self, threshold_s: float = 1.0, output_dir: str = "data/profiles",
+                 interval: float = 0.005, keep: int = 50):
+        self.threshold_s = threshold_s
+        self.output_dir = output_dir
+        self.interval = interval
+        self.keep = keep
+
+    @staticmethod
+    def _stack(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    @contextmanager
+    def profile(self, name: str = "request"):
+        thread_id = threading.get_ident()
+        samples = Counter()
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(self.interval):
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    samples[self._stack(frame)] += 1
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            done.set()
+            sampler.join()
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold_s and samples:
+                self._write(name, elapsed, samples)
+
+    def _write(self, name: str, elapsed: float, samples: Counter):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S') + f".{int(time.time() * 1000) % 1000:03d}"
+        path = os.path.join(self.output_dir, f"{stamp}_{name}_{int(elapsed * 1000)}ms.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, n in samples.most_common():
+                f.write(f"{stack} {n}\n")
+        # Only keep the newest profiles
+        profiles = sorted(os.listdir(self.output_dir))
+        for old in profiles[:-self.keep]:
+            os.remove(os.path.join(self.output_dir, old))
+
+
+def sinks_from_env() -> List[MetricsSink]:
+    """
+    Sinks configured through the environment:
+      SYMTRAIN_METRICS_PORT - Prometheus text endpoint on this port
+      SYMTRAIN_METRICS_LOG  - JSON lines file
+    """
+    sinks = []
+    port = os.environ.get("SYMTRAIN_METRICS_PORT")
+    if port:
+        sink = PrometheusSink()
+        sink.serve(int(port))
+        sinks.append(sink)
+    log_path = os.environ.get("SYMTRAIN_METRICS_LOG")
+    if log_path:
+        sinks.append(JsonLinesSink(log_path))
+    return sinks
+
+
+def profiler_from_env() -> Optional[SlowRequestProfiler]:
+    """
+    SYMTRAIN_PROFILE_SLOW_MS enables the slow-request profiler with that threshold.
+    """
+    threshold_ms = os.environ.get("SYMTRAIN_PROFILE_SLOW_MS")
+    if not threshold_ms:
+        return None
+    return SlowRequestProfiler(float(threshold_ms) / 1000, os.environ.get("SYMTRAIN_PROFILE_DIR", "data/profiles"))
@@ -0,0 +1,181 @@
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict
+
+# Keyword -> label used by the fake "model"
+MOCK_LABELS = {
+    "claim": "Insurance Claim",
+    "insurance": "Insurance Claim",
+    "payment": "Payment Update",
+    "card": "Payment Update",
+    "order": "Order Status",
+    "shipping": "Order Status",
+    "flight": "Flight Booking",
+    "booking": "Flight Booking",
+}
+
+
+def mock_answer(prompt: str) -> Dict:
+    """
+    Deterministic stand-in for the GPT analysis answer.
+    """
+    match = re.search(r'transcript:\s*"(.*?)"\s*1\.', prompt, flags=re.DOTALL)
+    transcript = (match.group(1) if match else prompt).lower()
+    category = next((label for word, label in MOCK_LABELS.items() if word in transcript), "General Inquiry")
+    agent_lines = [line.split(":", 1)[1].strip() for line in transcript.split("\n") if line.strip().startswith("agent:")]
+    return {"category": category, "steps": agent_lines[:5] or ["Greet the customer."]}
+
+
+class MockChatServer:
+    """
+    Local HTTP stand-in for POST /v1/chat/completions.
+
+    Every request waits `latency` seconds (+/- jitter); a `failure_rate` share
+    of requests gets a 429 (with Retry-After) or a 500 instead of an answer.
+    GET /stats returns request counts and the peak number of concurrent requests.
+
+        with MockChatServer(latency=0.1, failure_rate=0.2) as server:
+            client = AsyncChatClient("key", base_url=server.base_url)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.2,
+                 jitter: float = 0.25, failure_rate: float = 0.0, retry_after: float = 0.1, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "ok": 0, "rate_limited": 0, "server_errors": 0}
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._counts, "max_in_flight": self._max_in_flight}
+
+    def start(self) -> "MockChatServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _outcome(self):
+        with self._lock:
+            self._counts["requests"] += 1
+            roll = self._rng.random()
+            delay = self.latency * (1 + self.jitter * (2 * self._rng.random() - 1))
+        if roll < self.failure_rate / 2:
+            return "rate_limited", delay
+        if roll < self.failure_rate:
+            return "server_errors", delay
+        return "ok", delay
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: Dict, headers: Dict = None):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/stats"):
+                    self._send(200, server.stats())
+                else:
+                    self._send(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": "not found"}})
+                    return
+
+                with server._lock:
+                    server._in_flight += 1
+                    server._max_in_flight = max(server._max_in_flight, server._in_flight)
+                try:
+                    outcome, delay = server._outcome()
+                    time.sleep(max(0.0, delay))
+                    with server._lock:
+                        server._counts[outcome] += 1
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+
+                if outcome == "rate_limited":
+                    self._send(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_error"}},
+                               {"Retry-After": str(server.retry_after)})
+                    return
+                if outcome == "server_errors":
+                    self._send(500, {"error": {"message": "Internal server error (mock)", "type": "server_error"}})
+                    return
+
+                prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+                content = json.dumps(mock_answer(prompt))
+                prompt_tokens = max(1, len(prompt) // 4)
+                completion_tokens = max(1, len(content) // 4)
+                self._send(200, {
+                    "id": f"chatcmpl-mock-{server._counts['requests']}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "mock"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                })
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat-completions endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockChatServer(args.host, args.port, args.latency, failure_rate=args.failure_rate)
+    print(f"Mock chat completions at {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,220 @@
+import os
+import gc
+import threading
+from typing import Dict, Iterator, List, Tuple
+
+CLASSIFIER_TASK = "zero-shot-classification"
+CLASSIFIER_MODEL = "facebook/bart-large-mnli"
+SUMMARIZER_TASK = "summarization"
+SUMMARIZER_MODEL = "facebook/bart-large-cnn"
+
+# Intent labels and summary settings shared by the app, the analysis and the tools
+CATEGORIES = ["Insurance Claim", "Payment Update", "Order Status", "Flight Booking", "General Inquiry"]
+SUMMARY_PARAMS = {"max_length": 150, "min_length": 40, "do_sample": False}
+
+# Inference backend for the BART pipelines:
+#   "pytorch" - fp32 PyTorch (default)
+#   "int8"    - PyTorch with dynamic int8 quantization of the Linear layers
+#   "onnx"    - ONNX Runtime export (needs `pip install optimum[onnxruntime]`)
+BACKENDS = ("pytorch", "int8", "onnx")
+INFERENCE_BACKEND = os.environ.get("SYMTRAIN_INFERENCE_BACKEND", "pytorch")
+ONNX_CACHE_DIR = os.environ.get("SYMTRAIN_ONNX_CACHE", "models/onnx")
+
+# Only torch is used; keeps transformers from importing TensorFlow when it is installed
+os.environ.setdefault("USE_TF", "0")
+
+
+def process_rss_bytes() -> int:
+    """
+    Current resident memory of this process (0 if it cannot be read).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Peak RSS; KiB on Linux, bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+
+def _tensor_bytes(value) -> int:
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(v) for v in value)
+    if hasattr(value, "element_size"):
+        return value.numel() * value.element_size()
+    return 0
+
+
+def load_pipeline(task: str, model: str, backend: str = "pytorch"):
+    """
+    Builds a HuggingFace pipeline running on the requested backend.
+    """
+    # Imported here so importing this module does not pull in torch/transformers
+    from transformers import pipeline
+
+    if backend == "pytorch":
+        return pipeline(task, model=model)
+
+    if backend == "int8":
+        import torch
+        pipe = pipeline(task, model=model)
+        # Quantizing at load takes a few seconds, so there is nothing to cache on disk
+        pipe.model = torch.quantization.quantize_dynamic(pipe.model, {torch.nn.Linear}, dtype=torch.qint8)
+        return pipe
+
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification, ORTModelForSeq2SeqLM
+        except ImportError:
+            raise ImportError("The onnx backend needs `pip install optimum[onnxruntime]`.")
+        from transformers import AutoTokenizer
+
+        ort_class = ORTModelForSequenceClassification if task == CLASSIFIER_TASK else ORTModelForSeq2SeqLM
+        export_dir = os.path.join(ONNX_CACHE_DIR, model.replace("/", "__"))
+        if os.path.exists(os.path.join(export_dir, "config.json")):
+            ort_model = ort_class.from_pretrained(export_dir)
+            tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        else:
+            print(f"Exporting {model} to ONNX (one-time)...")
+            ort_model = ort_class.from_pretrained(model, export=True)
+            tokenizer = AutoTokenizer.from_pretrained(model)
+            ort_model.save_pretrained(export_dir)
+            tokenizer.save_pretrained(export_dir)
+        return pipeline(task, model=ort_model, tokenizer=tokenizer)
+
+    raise ValueError(f"Unknown inference backend: {backend} (expected one of {BACKENDS})")
+
+
+def stream_summary(pipe, text: str, max_length: int = SUMMARY_PARAMS["max_length"],
+                   min_length: int = SUMMARY_PARAMS["min_length"],
+                   timeout: float = 60.0) -> Iterator[str]:
+    """
+    Yields the summary of `text` in decoded pieces while the summarization
+    pipeline's model is still generating (TextIteratorStreamer, generation on a
+    background thread). Streaming needs greedy decoding (num_beams=1), so the
+    text can differ slightly from the pipeline's beam-search summary.
+    """
+    from transformers import TextIteratorStreamer
+
+    streamer = TextIteratorStreamer(pipe.tokenizer, skip_special_tokens=True, timeout=timeout)
+    inputs = pipe.tokenizer([text], return_tensors="pt", truncation=True)
+    device = getattr(pipe, "device", None)
+    if device is not None:
+        inputs = {name: tensor.to(device) for name, tensor in inputs.items()}
+    errors = []
+
+    def generate():
+        try:
+            pipe.model.generate(**inputs, streamer=streamer, max_length=max_length, min_length=min_length,
+                                num_beams=1, do_sample=False)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=generate, name="summary-stream", daemon=True)
+    thread.start()
+    for piece in streamer:
+        if piece:
+            yield piece
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+def model_id(model: str, backend: str = None) -> str:
+    """
+    Identifies a model + backend pair, e.g. for cache keys (int8 output can differ from fp32).
+    """
+    backend = backend or INFERENCE_BACKEND
+    return model if backend == "pytorch" else f"{model}@{backend}"
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of HuggingFace pipelines.
+
+    AnalysisEngine and FewShotGenerator both get their models from here, so
+    each model is loaded once per process no matter how many objects use it.
+    Loading is lazy and thread-safe: concurrent first calls for the same
+    model wait on one load instead of loading twice.
+    """
+
+    def __init__(self):
+        self._pipelines: Dict[Tuple[str, str, str], object] = {}
+        self._locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key: Tuple[str, str, str]) -> threading.Lock:
+        with self._lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def get(self, task: str, model: str, backend: str = None):
+        """
+        Returns the pipeline, loading it on first use. backend defaults to INFERENCE_BACKEND.
+        """
+        key = (task, model, backend or INFERENCE_BACKEND)
+        pipe = self._pipelines.get(key)
+        if pipe is not None:
+            return pipe
+
+        with self._key_lock(key):
+            pipe = self._pipelines.get(key)
+            if pipe is None:
+                print(f"Loading {model} ({key[2]})...")
+                pipe = load_pipeline(*key)
+                self._pipelines[key] = pipe
+        return pipe
+
+    def is_loaded(self, task: str, model: str, backend: str = None) -> bool:
+        return (task, model, backend or INFERENCE_BACKEND) in self._pipelines
+
+    def loaded(self) -> List[Tuple[str, str, str]]:
+        return list(self._pipelines.keys())
+
+    def unload(self, task: str = None, model: str = None, backend: str = None):
+        """
+        Drops cached pipelines (all of them if nothing is given).
+        Objects that still hold a reference keep the weights alive.
+        """
+        with self._lock:
+            for key in list(self._pipelines.keys()):
+                if ((task is None or key[0] == task) and (model is None or key[1] == model)
+                        and (backend is None or key[2] == backend)):
+                    del self._pipelines[key]
+        gc.collect()
+
+    def memory_report(self) -> Dict:
+        """
+        Parameter memory per loaded model plus the process RSS, in MB.
+        ONNX Runtime models hold their weights outside torch and are not counted.
+        """
+        models = {}
+        for (task, model, backend), pipe in list(self._pipelines.items()):
+            if not hasattr(pipe.model, "parameters"):
+                continue
+            # Quantized Linear layers keep packed weights outside parameters(), so count the state dict
+            n_bytes = sum(_tensor_bytes(value) for value in pipe.model.state_dict().values())
+            models[f"{task}:{model_id(model, backend)}"] = round(n_bytes / 2**20, 1)
+        return {
+            "models_mb": models,
+            "total_model_mb": round(sum(models.values()), 1),
+            "process_rss_mb": round(process_rss_bytes() / 2**20, 1),
+        }
+
+
+# The shared registry for this process
+registry = ModelRegistry()
+
+
+def get_classifier():
+    return registry.get(CLASSIFIER_TASK, CLASSIFIER_MODEL)
+
+
+def get_summarizer():
+    return registry.get(SUMMARIZER_TASK, SUMMARIZER_MODEL)
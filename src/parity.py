@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import argparse
+import difflib
+import pandas as pd
+from typing import List, Dict
+from src.batching import run_batched
+from src.models import (registry, model_id, CLASSIFIER_TASK, CLASSIFIER_MODEL, SUMMARIZER_TASK, SUMMARIZER_MODEL,
+                        CATEGORIES, SUMMARY_PARAMS)
+
+
+def run_backend(backend: str, texts: List[str], batch_size: int) -> Dict:
+    """
+    Labels and summaries for every text on one backend, plus wall time per stage.
+    """
+    start = time.perf_counter()
+    classifier = registry.get(CLASSIFIER_TASK, CLASSIFIER_MODEL, backend)
+    summarizer = registry.get(SUMMARIZER_TASK, SUMMARIZER_MODEL, backend)
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels = run_batched(
+        lambda batch: classifier(batch, candidate_labels=CATEGORIES, batch_size=len(batch)),
+        texts, batch_size
+    )
+    classify_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summaries = run_batched(
+        lambda batch: summarizer(batch, batch_size=len(batch), **SUMMARY_PARAMS),
+        texts, batch_size
+    )
+    summarize_s = time.perf_counter() - start
+
+    return {
+        "labels": [None if isinstance(r, Exception) else r['labels'][0] for r in labels],
+        "summaries": [None if isinstance(r, Exception) else r['summary_text'] for r in summaries],
+        "load_s": load_s,
+        "classify_s": classify_s,
+        "summarize_s": summarize_s,
+    }
+
+
+def compare(reference: Dict, candidate: Dict) -> Dict:
+    """
+    Agreement of a candidate backend with the fp32 reference (None values
+    for an empty corpus).
+    """
+    n = len(reference["labels"])
+    if n == 0:
+        return {key: None for key in ("label_agreement", "summary_exact_match", "summary_similarity_mean",
+                                      "summary_similarity_min", "classify_speedup", "summarize_speedup")}
+    label_agreement = sum(a == b for a, b in zip(reference["labels"], candidate["labels"])) / n
+    exact_summaries = sum(a == b for a, b in zip(reference["summaries"], candidate["summaries"])) / n
+    similarity = [
+        difflib.SequenceMatcher(None, a or "", b or "").ratio()
+        for a, b in zip(reference["summaries"], candidate["summaries"])
+    ]
+    return {
+        "label_agreement": round(label_agreement, 4),
+        "summary_exact_match": round(exact_summaries, 4),
+        "summary_similarity_mean": round(sum(similarity) / n, 4),
+        "summary_similarity_min": round(min(similarity), 4),
+        "classify_speedup": round(reference["classify_s"] / max(candidate["classify_s"], 1e-9), 2),
+        "summarize_speedup": round(reference["summarize_s"] / max(candidate["summarize_s"], 1e-9), 2),
+    }
+
+
+def run_parity(data_path: str, backends: List[str], limit: int = None, batch_size: int = 8) -> Dict:
+    df = pd.read_csv(data_path)
+    texts = [t[:1024] for t in df['full_transcript'].fillna("").tolist() if t]
+    if limit:
+        texts = texts[:limit]
+
+    report = {"n_transcripts": len(texts), "reference": model_id(CLASSIFIER_MODEL, "pytorch"), "backends": {}}
+    if not texts:
+        print("No transcripts to compare.")
+        return report
+
+    print(f"Running fp32 reference on {len(texts)} transcripts...")
+    reference = run_backend("pytorch", texts, batch_size)
+    for backend in backends:
+        if backend == "pytorch":
+            continue
+        print(f"Running {backend}...")
+        candidate = run_backend(backend, texts, batch_size)
+        report["backends"][backend] = compare(reference, candidate)
+        # Free the candidate weights before loading the next backend
+        registry.unload(backend=backend)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy/speed parity of optimized backends against fp32.")
+    parser.add_argument("--data", default="data/processed/knowledge_base.csv")
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx"])
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N transcripts.")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--output", default="data/processed/parity_report.json")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data):
+        print("Data file not found! Please run data_loader.py first.")
+    else:
+        report = run_parity(args.data, args.backends, args.limit, args.batch_size)
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(json.dumps(report, indent=2))
+        print(f"Report saved to: {args.output}")
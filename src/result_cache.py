@@ -0,0 +1,242 @@
+import os
+import re
+import copy
+import json
+import time
+import zlib
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, FrozenSet, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_S = 3600.0
+DEFAULT_SHINGLE_SIZE = 3
+
+_PUNCT = re.compile(r"[^\w\s]")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Canonical form of a query: Unicode NFKC, case-folded, punctuation dropped,
+    whitespace collapsed. "Hi,  I need to FILE a claim!" -> "hi i need to file a claim"
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _SPACE.sub(" ", _PUNCT.sub(" ", text)).strip()
+
+
+def shingles(normalized: str, size: int = DEFAULT_SHINGLE_SIZE) -> FrozenSet[int]:
+    """
+    Hashed word n-grams of a normalized query (the whole query if it is shorter).
+    """
+    words = normalized.split()
+    grams = [" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))]
+    return frozenset(zlib.crc32(g.encode('utf-8')) for g in grams)
+
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def source_signature(path: Optional[str]) -> Optional[Tuple[int, float]]:
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return st.st_size, st.st_mtime
+
+
+class QueryResultCache:
+    """
+    LRU + TTL cache of generate_steps results keyed on the normalized query.
+
+    Keys also include a version string (knowledge base fingerprint, model ids,
+    classification/summary modes) set with `bind`, so results from another
+    configuration are never returned. The bound source file (knowledge_base.csv)
+    is re-stat'ed at most once per `check_interval` seconds; when it changes the
+    cache is cleared and the `on_invalidate` hook passed to `bind` runs (the
+    generator reloads its knowledge base and binds the new fingerprint).
+
+    With `similarity` set (e.g. 0.8), a miss falls back to the cached query with
+    the highest Jaccard similarity of hashed word shingles, if it reaches the
+    threshold. Off by default: "cancel my order" and "don't cancel my order"
+    share most shingles.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_s: float = DEFAULT_TTL_S,
+                 similarity: Optional[float] = None, shingle_size: int = DEFAULT_SHINGLE_SIZE,
+                 check_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.similarity = similarity
+        self.shingle_size = shingle_size
+        self.check_interval = check_interval
+        self.version = ""
+        self.source_path = None
+        self.on_invalidate = None
+        self._signature = None
+        self._checked_at = 0.0
+        # key -> (result, expires_at, shingles)
+        self._entries: "OrderedDict[str, Tuple[Dict, float, FrozenSet[int]]]" = OrderedDict()
+        self._index: Dict[int, set] = defaultdict(set)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def bind(self, version: str, source_path: Optional[str] = None, on_invalidate: Optional[Callable[[], None]] = None):
+        """
+        Sets the version folded into every key, the file whose changes clear the
+        cache and the hook called (outside the lock) after such a change.
+        """
+        with self._lock:
+            if version != self.version:
+                self._clear()
+            self.version = version
+            self.source_path = source_path
+            self.on_invalidate = on_invalidate
+            self._signature = source_signature(source_path)
+            self._checked_at = time.monotonic()
+
+    def key(self, normalized: str) -> str:
+        payload = json.dumps({"query": normalized, "version": self.version})
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _clear(self):
+        self._entries.clear()
+        self._index.clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _check_source(self) -> bool:
+        """
+        Clears the cache if the source file changed; True if it did.
+        """
+        now = time.monotonic()
+        if self.source_path is None or now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        signature = source_signature(self.source_path)
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        if self._entries:
+            print(f"{self.source_path} changed, clearing {len(self._entries)} cached results.")
+        self._clear()
+        self.invalidations += 1
+        return True
+
+    def _invalidated(self):
+        if self.on_invalidate is not None:
+            self.on_invalidate()
+
+    def _drop(self, key: str):
+        _, _, grams = self._entries.pop(key)
+        for gram in grams:
+            keys = self._index.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[gram]
+
+    def _live(self, key: str, now: float) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _nearest(self, grams: FrozenSet[int], now: float) -> Optional[Dict]:
+        candidates = set()
+        for gram in grams:
+            candidates |= self._index.get(gram, set())
+        best_key, best_score = None, self.similarity
+        for key in candidates:
+            score = jaccard(grams, self._entries[key][2])
+            if score >= best_score:
+                best_key, best_score = key, score
+        return None if best_key is None else self._live(best_key, now)
+
+    def get(self, query: str) -> Optional[Dict]:
+        """
+        A copy of the cached result for `query` (or a near duplicate), or None.
+        """
+        if self.max_entries <= 0:
+            return None
+        normalized = normalize_query(query)
+        with self._lock:
+            changed = self._check_source()
+        if changed:
+            # Runs before the lookup, so the caller sees the reloaded state
+            self._invalidated()
+        now = time.monotonic()
+        with self._lock:
+            result = self._live(self.key(normalized), now)
+            if result is None and self.similarity is not None:
+                result = self._nearest(shingles(normalized, self.shingle_size), now)
+                if result is not None:
+                    self.near_hits += 1
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.deepcopy(result)
+
+    def put(self, query: str, result: Dict, version: Optional[str] = None):
+        """
+        Caches `result`. `version` is the one current when the caller started
+        computing it; a result from before a re-bind is dropped.
+        """
+        if self.max_entries <= 0:
+            return
+        normalized = normalize_query(query)
+        result = copy.deepcopy({k: v for k, v in result.items() if k != "timings"})
+        grams = shingles(normalized, self.shingle_size) if self.similarity is not None else frozenset()
+        with self._lock:
+            changed = self._check_source()
+            if not changed and (version is None or version == self.version):
+                key = self.key(normalized)
+                if key in self._entries:
+                    self._drop(key)
+                self._entries[key] = (result, time.monotonic() + self.ttl_s, grams)
+                for gram in grams:
+                    self._index[gram].add(key)
+                while len(self._entries) > self.max_entries:
+                    self._drop(next(iter(self._entries)))
+        if changed:
+            self._invalidated()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "invalidations": self.invalidations,
+            }
+
+
+def result_cache_from_env() -> Optional[QueryResultCache]:
+    """
+    Result cache configured through the environment:
+      SYMTRAIN_RESULT_CACHE_SIZE       - max cached queries (default 512, 0 disables)
+      SYMTRAIN_RESULT_CACHE_TTL        - seconds a result stays valid (default 3600)
+      SYMTRAIN_RESULT_CACHE_SIMILARITY - shingle similarity for near-duplicate hits (off by default)
+    """
+    size = int(os.environ.get("SYMTRAIN_RESULT_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+    if size <= 0:
+        return None
+    similarity = os.environ.get("SYMTRAIN_RESULT_CACHE_SIMILARITY")
+    return QueryResultCache(size, float(os.environ.get("SYMTRAIN_RESULT_CACHE_TTL", DEFAULT_TTL_S)),
+                            float(similarity) if similarity else None)
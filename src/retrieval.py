@@ -0,0 +1,309 @@
+import os
+import hashlib
+import pickle
+import numpy as np
+from collections import Counter
+from typing import List, Dict, Optional, Tuple, TYPE_CHECKING
+from src.knowledge_base import CATEGORY_PATTERNS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Bump this whenever the on-disk layout of the index changes
+INDEX_VERSION = 1
+
+# Name of the fallback partition holding every row
+ALL_ROWS = "all"
+
+
+def file_fingerprint(path: str) -> str:
+    """
+    Content hash of a file, used to detect when the knowledge base changed.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_category_partitions(companies: "pd.Series", patterns: Dict[str, str] = None,
+                              categories: "pd.Series" = None) -> Dict[str, np.ndarray]:
+    """
+    Maps each category keyword to the integer row ids of its companies.
+    The fallback partition (ALL_ROWS) holds every row.
+    `categories` is the precomputed '|'-joined keyword column of the Parquet
+    knowledge base; it replaces the regex scan when the default patterns are used.
+    """
+    use_precomputed = patterns is None and categories is not None
+    patterns = CATEGORY_PATTERNS if patterns is None else patterns
+    companies = companies.fillna("")
+
+    partitions = {}
+    for keyword, pattern in patterns.items():
+        if use_precomputed:
+            mask = categories.fillna("").str.split("|").apply(lambda keys: keyword in keys).to_numpy(dtype=bool)
+        else:
+            mask = companies.str.contains(pattern, case=False, na=False).to_numpy()
+        partitions[keyword] = np.flatnonzero(mask)
+    partitions[ALL_ROWS] = np.arange(len(companies))
+    return partitions
+
+
+def partition_for_category(category: str, partitions: Dict[str, np.ndarray]) -> str:
+    """
+    Picks the partition to search for a predicted category.
+    Falls back to ALL_ROWS if no keyword matches or the partition is empty.
+    """
+    for keyword, rows in partitions.items():
+        if keyword != ALL_ROWS and keyword in category:
+            return keyword if len(rows) > 0 else ALL_ROWS
+    return ALL_ROWS
+
+
+class Retriever:
+    """
+    Interface shared by the retrieval backends used by FewShotGenerator.
+
+    Rows are integer positions in the knowledge base. Backends can precompute
+    named partitions (one per category) and search inside them.
+    """
+
+    def add_partition(self, name: str, rows: np.ndarray):
+        raise NotImplementedError
+
+    def partition_sizes(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def search(self, query: str, k: int = 5, rows: Optional[np.ndarray] = None,
+               partition: Optional[str] = None) -> List[Tuple[int, float]]:
+        """
+        Returns up to k (row id, score) pairs, best first.
+        """
+        raise NotImplementedError
+
+    def best_match(self, query: str, rows: Optional[np.ndarray] = None, partition: Optional[str] = None) -> int:
+        """
+        Returns the knowledge base row id of the most similar document.
+        """
+        results = self.search(query, k=1, rows=rows, partition=partition)
+        if not results:
+            raise ValueError("No documents to search.")
+        return results[0][0]
+
+
+def load_retriever(backend: str, documents: List[str], data_dir: str, fingerprint: Optional[str]) -> Retriever:
+    """
+    Builds (or loads from data_dir) the retriever for the chosen backend: 'tfidf' or 'dense'.
+    """
+    if backend == "tfidf":
+        return TfidfIndex.load_or_build(documents, os.path.join(data_dir, "tfidf_index.pkl"), fingerprint)
+    if backend == "dense":
+        # Imported lazily: needs the optional sentence-transformers / hnswlib packages
+        from src.dense_retrieval import DenseRetriever
+        return DenseRetriever(documents, cache_dir=os.path.join(data_dir, "embeddings"))
+    raise ValueError(f"Unknown retrieval backend: {backend}")
+
+
+class TfidfIndex(Retriever):
+    """
+    TF-IDF retrieval index that is fit ONCE over the knowledge base.
+
+    We keep the raw term counts instead of a fixed TF-IDF matrix. At query time
+    the IDF weights are re-derived for the candidate rows (+ the query itself),
+    which gives exactly the same cosine scores as refitting a
+    TfidfVectorizer(stop_words='english') on [query] + candidates, but only
+    touches the columns of the terms that appear in the query.
+    """
+
+    def __init__(self, stop_words: str = 'english'):
+        self.stop_words = stop_words
+        self.vectorizer = None
+        self.counts = None          # (n_docs x vocab) CSC matrix of raw term counts
+        self.fingerprint = None
+        self._analyzer = None
+        self._partitions = {}
+
+    def fit(self, documents: List[str], fingerprint: Optional[str] = None) -> "TfidfIndex":
+        from sklearn.feature_extraction.text import CountVectorizer
+        self.vectorizer = CountVectorizer(stop_words=self.stop_words)
+        self.counts = self.vectorizer.fit_transform(documents).astype(np.float64).tocsc()
+        self.counts.eliminate_zeros()
+        self.fingerprint = fingerprint
+        self._analyzer = self.vectorizer.build_analyzer()
+        self._partitions = {}
+        return self
+
+    # --- Persistence ---
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({
+                "version": INDEX_VERSION,
+                "fingerprint": self.fingerprint,
+                "stop_words": self.stop_words,
+                "vectorizer": self.vectorizer,
+                "counts": self.counts,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, fingerprint: Optional[str] = None) -> Optional["TfidfIndex"]:
+        """
+        Returns the saved index, or None if it is missing, stale or from an old version.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f"Could not read index {path}: {e}")
+            return None
+
+        if state.get("version") != INDEX_VERSION or state.get("fingerprint") != fingerprint:
+            return None
+
+        index = cls(stop_words=state["stop_words"])
+        index.vectorizer = state["vectorizer"]
+        index.counts = state["counts"]
+        index.fingerprint = fingerprint
+        index._analyzer = index.vectorizer.build_analyzer()
+        return index
+
+    @classmethod
+    def load_or_build(cls, documents: List[str], path: str, fingerprint: Optional[str]) -> "TfidfIndex":
+        """
+        Loads the on-disk index if it matches the knowledge base, otherwise rebuilds and saves it.
+        """
+        index = cls.load(path, fingerprint) if fingerprint else None
+        if index is not None and index.counts.shape[0] == len(documents):
+            print(f"Loaded retrieval index from {path}")
+            return index
+
+        print("Building retrieval index...")
+        index = cls().fit(documents, fingerprint)
+        if fingerprint:
+            index.save(path)
+        return index
+
+    # --- Search ---
+
+    def add_partition(self, name: str, rows: np.ndarray):
+        """
+        Precomputes a named slice of the index (e.g. one per category).
+        """
+        self._partitions[name] = self._build_partition(rows)
+
+    def partition_sizes(self) -> Dict[str, int]:
+        return {name: part["n_docs"] for name, part in self._partitions.items()}
+
+    def _partition(self, rows: Optional[np.ndarray] = None, name: Optional[str] = None) -> Dict:
+        """
+        Looks up a named partition, or the cached partition for an ad-hoc set of rows.
+        """
+        if name is not None:
+            return self._partitions[name]
+
+        if rows is None:
+            rows = np.arange(self.counts.shape[0])
+        rows = np.asarray(rows, dtype=np.int64)
+        key = hashlib.md5(rows.tobytes()).hexdigest()
+
+        part = self._partitions.get(key)
+        if part is None:
+            part = self._build_partition(rows)
+            self._partitions[key] = part
+        return part
+
+    def _build_partition(self, rows: np.ndarray) -> Dict:
+        """
+        Per-subset statistics (doc count, document frequency, IDF and squared
+        document norms). Computed once per partition.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        counts = self.counts[rows]
+        counts.eliminate_zeros()
+        n_docs = counts.shape[0]
+        doc_freq = np.diff(counts.indptr)
+        # smooth_idf with the query counted as one extra document
+        idf = np.log((n_docs + 2) / (doc_freq + 1)) + 1
+        norm2 = np.asarray(counts.power(2) @ (idf ** 2)).ravel()
+        return {
+            "rows": rows,
+            "counts": counts,
+            "n_docs": n_docs,
+            "doc_freq": doc_freq,
+            "idf": idf,
+            "norm2": norm2,
+        }
+
+    def scores(self, query: str, rows: Optional[np.ndarray] = None, partition: Optional[str] = None) -> np.ndarray:
+        """
+        Cosine similarity of the query against each row of the partition (in row order).
+        """
+        if self.vectorizer is None:
+            raise ValueError("Index has not been fit.")
+
+        return self._score_partition(query, self._partition(rows, partition))
+
+    def _score_partition(self, query: str, part: Dict) -> np.ndarray:
+        n_docs = part["n_docs"]
+
+        term_counts = Counter(self._analyzer(query))
+        vocab = self.vectorizer.vocabulary_
+        cols, query_tf = [], []
+        oov_tf = []
+        for term, tf in term_counts.items():
+            col = vocab.get(term)
+            if col is None:
+                oov_tf.append(tf)
+            else:
+                cols.append(col)
+                query_tf.append(tf)
+
+        if not cols:
+            return np.zeros(n_docs)
+
+        cols = np.asarray(cols)
+        query_tf = np.asarray(query_tf, dtype=np.float64)
+
+        # IDF for terms in the query (their document frequency includes the query)
+        base_idf = part["idf"][cols]
+        query_idf = np.log((n_docs + 2) / (part["doc_freq"][cols] + 2)) + 1
+        query_weights = query_tf * query_idf
+
+        # Terms only seen in the query still count towards the query norm
+        oov_idf = np.log((n_docs + 2) / 2) + 1
+        query_norm = np.sqrt(np.sum(query_weights ** 2) + np.sum((np.asarray(oov_tf) * oov_idf) ** 2))
+
+        doc_counts = part["counts"][:, cols]
+        numerator = np.asarray(doc_counts @ (query_idf * query_weights)).ravel()
+        norm2 = part["norm2"] - np.asarray(doc_counts.power(2) @ (base_idf ** 2 - query_idf ** 2)).ravel()
+        doc_norm = np.sqrt(np.maximum(norm2, 0.0))
+
+        denom = doc_norm * query_norm
+        sims = np.zeros(n_docs)
+        np.divide(numerator, denom, out=sims, where=denom > 0)
+        return sims
+
+    def search(self, query: str, k: int = 5, rows: Optional[np.ndarray] = None,
+               partition: Optional[str] = None) -> List[Tuple[int, float]]:
+        part = self._partition(rows, partition)
+        if part["n_docs"] == 0:
+            return []
+        sims = self._score_partition(query, part)
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        # Stable sort so ties keep row order (same as argmax)
+        top = top[np.lexsort((top, -sims[top]))]
+        return [(int(part["rows"][i]), float(sims[i])) for i in top]
+
+    def best_match(self, query: str, rows: Optional[np.ndarray] = None, partition: Optional[str] = None) -> int:
+        part = self._partition(rows, partition)
+        if part["n_docs"] == 0:
+            raise ValueError("No documents to search.")
+        sims = self._score_partition(query, part)
+        return int(part["rows"][sims.argmax()])
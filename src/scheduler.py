@@ -0,0 +1,170 @@
+import time
+import queue
+import threading
+from typing import List, Dict, Optional
+
+DEFAULT_MAX_BATCH = 8
+DEFAULT_MAX_WAIT_MS = 10
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_TIMEOUT_S = 60.0
+
+
+class QueueFullError(RuntimeError):
+    """
+    Raised when the scheduler queue is at capacity (the caller should retry later).
+    """
+
+
+class _Request:
+    __slots__ = ("query", "include_timings", "enqueued", "done", "result", "error", "cancelled")
+
+    def __init__(self, query: str, include_timings: bool):
+        self.query = query
+        self.include_timings = include_timings
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+
+
+class MicroBatchScheduler:
+    """
+    Coalesces concurrent generate_steps calls into generate_steps_batch calls.
+
+    A single worker thread takes the first waiting request, then keeps
+    collecting for up to `max_wait_ms` (or until `max_batch_size` requests),
+    runs them as one batch through the classifier and summarizer, and hands
+    each caller its own result. The queue is bounded (QueueFullError when
+    full) and callers stop waiting after `timeout_s` (TimeoutError).
+
+        scheduler = MicroBatchScheduler(generator).start()
+        result = scheduler.submit("I need to file a claim")
+    """
+
+    def __init__(self, generator, max_batch_size: int = DEFAULT_MAX_BATCH, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 max_queue: int = DEFAULT_MAX_QUEUE, timeout_s: float = DEFAULT_TIMEOUT_S):
+        self.generator = generator
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.timeout_s = timeout_s
+        self._queue: "queue.Queue[_Request]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "timed_out": 0,
+                       "batches": 0, "batched_requests": 0, "split_batches": 0, "max_queue_depth": 0}
+
+    def start(self) -> "MicroBatchScheduler":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="micro-batch-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self.queue_depth
+        stats["mean_batch_size"] = round(stats["batched_requests"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self._stats[name] += value
+
+    def _publish_depth(self):
+        depth = self.queue_depth
+        with self._lock:
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], depth)
+        # Exported by sinks that support gauges (e.g. PrometheusSink)
+        for sink in getattr(self.generator, "metrics_sinks", []):
+            if hasattr(sink, "set_gauge"):
+                sink.set_gauge("scheduler_queue_depth", depth)
+
+    def submit(self, query: str, timeout: Optional[float] = None, include_timings: bool = False) -> Dict:
+        """
+        Blocks until the batch holding this query has run and returns its result.
+        """
+        self.start()
+        request = _Request(query, include_timings)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self._count("rejected")
+            raise QueueFullError(f"Scheduler queue is full ({self._queue.maxsize} waiting requests)")
+        self._count("submitted")
+        self._publish_depth()
+
+        timeout = self.timeout_s if timeout is None else timeout
+        if not request.done.wait(timeout):
+            # The worker skips cancelled requests that have not started yet
+            request.cancelled = True
+            self._count("timed_out")
+            raise TimeoutError(f"No result within {timeout}s")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self) -> List[_Request]:
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while not self._stop.is_set():
+            batch = [r for r in self._collect() if not r.cancelled]
+            if not batch:
+                continue
+            self._publish_depth()
+            self._run(batch)
+
+    def _run(self, batch: List[_Request]):
+        started = time.perf_counter()
+        include_timings = any(r.include_timings for r in batch)
+        try:
+            results = self.generator.generate_steps_batch([r.query for r in batch], include_timings=include_timings)
+        except Exception as e:
+            if len(batch) > 1:
+                # Re-run each request alone so only the offending one gets the error
+                self._count("split_batches")
+                for request in batch:
+                    self._run([request])
+                return
+            batch[0].error = e
+            batch[0].done.set()
+            self._count("failed")
+            return
+
+        for request, result in zip(batch, results):
+            if include_timings:
+                if request.include_timings:
+                    result["timings"] = {**result["timings"], "queue_wait_s": round(started - request.enqueued, 6)}
+                else:
+                    result.pop("timings", None)
+            request.result = result
+            request.done.set()
+        self._count("batches")
+        self._count("batched_requests", len(batch))
+        self._count("completed", len(batch))
@@ -0,0 +1,159 @@
+import json
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Tuple
+from src.warmup import BackgroundLoader
+from src.scheduler import MicroBatchScheduler, QueueFullError, DEFAULT_MAX_BATCH, DEFAULT_MAX_WAIT_MS, DEFAULT_MAX_QUEUE
+
+# Largest accepted request body
+MAX_BODY_BYTES = 10 << 20
+MAX_BATCH_QUERIES = 1000
+
+
+class GenerateService:
+    """
+    HTTP/JSON front end for FewShotGenerator; the models stay loaded for the
+    life of the process.
+
+      GET  /health          -> readiness (200 when ready, 503 while loading)
+      GET  /stats           -> scheduler, summary and result cache statistics
+      POST /generate        {"query": "...", "timings": false}  -> generate_steps result
+      POST /generate_batch  {"queries": ["...", ...]}           -> {"results": [...]}
+
+    Single queries go through the micro-batching scheduler, so concurrent
+    callers share forward passes; batch requests run as one generate_steps_batch.
+    """
+
+    def __init__(self, data_path: str = "data/processed/knowledge_base.csv", generator_kwargs: Dict = None,
+                 max_batch_size: int = DEFAULT_MAX_BATCH, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 max_queue: int = DEFAULT_MAX_QUEUE, timeout_s: float = 60.0):
+        self.scheduler = None
+        self._scheduler_args = dict(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                                    max_queue=max_queue, timeout_s=timeout_s)
+
+        def build():
+            from src.generator import FewShotGenerator
+            from src.metrics import sinks_from_env, profiler_from_env
+            from src.result_cache import result_cache_from_env
+            kwargs = {"metrics_sinks": sinks_from_env(), "profiler": profiler_from_env(),
+                      "result_cache": result_cache_from_env(), **(generator_kwargs or {})}
+            generator = FewShotGenerator(data_path=data_path, **kwargs)
+            self.scheduler = MicroBatchScheduler(generator, **self._scheduler_args).start()
+            return generator
+
+        self.loader = BackgroundLoader(build)
+
+    def handle(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        """
+        Routes one request; returns (HTTP status, JSON body).
+        """
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        if method == "GET" and path == "/health":
+            status = self.loader.status()
+            return (200 if status["state"] == "ready" else 503), status
+        if method == "GET" and path == "/stats":
+            if not self.loader.ready:
+                return 503, self.loader.status()
+            generator = self.loader.get()
+            stats = {"scheduler": self.scheduler.stats(), "summary_cache": generator.summary_cache.stats()}
+            if generator.result_cache is not None:
+                stats["result_cache"] = generator.result_cache.stats()
+            return 200, stats
+        if method != "POST" or path not in ("/generate", "/generate_batch"):
+            return 404, {"error": f"No route for {method} {path}"}
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError as e:
+            return 400, {"error": f"Invalid JSON: {e}"}
+        if not isinstance(payload, dict):
+            return 400, {"error": "Expected a JSON object"}
+        if not self.loader.ready:
+            return 503, self.loader.status()
+
+        include_timings = bool(payload.get("timings", False))
+        if path == "/generate":
+            query = payload.get("query")
+            if not isinstance(query, str) or not query.strip():
+                return 400, {"error": "'query' must be a non-empty string"}
+            try:
+                return 200, self.scheduler.submit(query, include_timings=include_timings)
+            except QueueFullError as e:
+                return 503, {"error": str(e)}
+            except TimeoutError as e:
+                return 504, {"error": str(e)}
+
+        queries = payload.get("queries")
+        if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            return 400, {"error": "'queries' must be a list of strings"}
+        if len(queries) > MAX_BATCH_QUERIES:
+            return 413, {"error": f"At most {MAX_BATCH_QUERIES} queries per batch"}
+        generator = self.loader.get()
+        return 200, {"results": generator.generate_steps_batch(queries, include_timings=include_timings)}
+
+    def make_server(self, host: str = "0.0.0.0", port: int = 8080) -> ThreadingHTTPServer:
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_BODY_BYTES:
+                    status, body = 413, {"error": "Request body too large"}
+                    self.close_connection = True
+                else:
+                    try:
+                        status, body = service.handle(method, self.path, self.rfile.read(length) if length else b"")
+                    except Exception as e:
+                        status, body = 500, {"error": str(e)}
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if status == 503:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP/JSON service for generate_steps.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data", default="data/processed/knowledge_base.csv")
+    parser.add_argument("--retriever", choices=["tfidf", "dense"], default="tfidf")
+    parser.add_argument("--classification-mode", default="mnli")
+    parser.add_argument("--summary-mode", default="window")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    service = GenerateService(
+        args.data,
+        {"retriever": args.retriever, "classification_mode": args.classification_mode, "summary_mode": args.summary_mode},
+        args.max_batch, args.max_wait_ms, args.max_queue, args.timeout,
+    )
+    # Start serving (and answering /health) while the models load
+    service.loader.start()
+    server = service.make_server(args.host, args.port)
+    print(f"Serving generate_steps on http://{args.host}:{args.port} (models loading in the background)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
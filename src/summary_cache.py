@@ -0,0 +1,144 @@
+import os
+import json
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from src.batching import run_batched
+
+
+def summary_key(text: str, model_id: str, params: Dict) -> str:
+    """
+    Content address of a summary: hash of (input text, model id, generation params).
+    """
+    payload = json.dumps({"text": text, "model": model_id, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SummaryCache:
+    """
+    Two-tier cache for summarizer outputs.
+
+    - Tier 1: in-memory LRU (max_entries items).
+    - Tier 2 (optional): SQLite file that survives restarts and can be
+      pre-filled offline with `python -m src.summary_cache --precompute`.
+    """
+
+    def __init__(self, max_entries: int = 1024, db_path: Optional[str] = None, table: str = "summaries"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table}")
+        self.max_entries = max_entries
+        self.db_path = db_path
+        # Other content-addressed outputs (e.g. GPT answers) use their own table
+        self.table = table
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._connect()
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, summary TEXT NOT NULL)")
+        self._db.commit()
+
+    def reopen(self):
+        """
+        Fresh lock and SQLite connection for a forked child (neither may be shared with the parent).
+        """
+        self._lock = threading.Lock()
+        if self.db_path:
+            self._connect()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            summary = self._memory.get(key)
+            if summary is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return summary
+
+            if self._db is not None:
+                row = self._db.execute(f"SELECT summary FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, summary: str):
+        with self._lock:
+            self._remember(key, summary)
+            if self._db is not None:
+                self._db.execute(f"INSERT OR REPLACE INTO {self.table} (key, summary) VALUES (?, ?)", (key, summary))
+                self._db.commit()
+
+    def _remember(self, key: str, summary: str):
+        self._memory[key] = summary
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            return stats
+
+
+def cached_summarize(summarizer, texts: List[str], cache: SummaryCache, model_id: str,
+                     params: Dict, batch_size: int) -> List:
+    """
+    Runs the summarizer over length-bucketed batches, skipping cached texts.
+    Each entry is the summary text, or the exception raised for that text.
+    """
+    keys = [summary_key(text, model_id, params) for text in texts]
+    results = [cache.get(key) for key in keys]
+
+    todo = [i for i, summary in enumerate(results) if summary is None]
+    if todo:
+        outputs = run_batched(
+            lambda batch: summarizer(batch, batch_size=len(batch), **params),
+            [texts[i] for i in todo], batch_size
+        )
+        for i, out in zip(todo, outputs):
+            if isinstance(out, Exception):
+                results[i] = out
+            else:
+                results[i] = out['summary_text']
+                cache.put(keys[i], results[i])
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summary cache tools.")
+    parser.add_argument("--precompute", action="store_true", help="Summarize the whole knowledge base into the on-disk cache.")
+    parser.add_argument("--data", default="data/processed/knowledge_base.csv")
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+
+    from src.generator import FewShotGenerator
+
+    generator = FewShotGenerator(data_path=args.data)
+    if args.precompute:
+        count = generator.precompute_summaries(batch_size=args.batch_size)
+        print(f"Cached summaries for {count} transcripts.")
+    print(json.dumps(generator.summary_cache.stats(), indent=2))
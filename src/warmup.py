@@ -0,0 +1,112 @@
+import time
+import argparse
+import threading
+from typing import Callable, Dict, Optional
+
+# Readiness states of a BackgroundLoader
+PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "failed"
+
+
+class BackgroundLoader:
+    """
+    Builds an expensive object (e.g. the FewShotGenerator) on a daemon thread
+    so the caller can render/serve immediately and poll `status()`.
+
+        loader = BackgroundLoader(FewShotGenerator).start()
+        if loader.ready:
+            generator = loader.get()
+    """
+
+    def __init__(self, factory: Callable, name: str = "generator"):
+        self.factory = factory
+        self.name = name
+        self.state = PENDING
+        self.error: Optional[BaseException] = None
+        self._result = None
+        self._started_at = None
+        self._finished_at = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> "BackgroundLoader":
+        with self._lock:
+            if self.state == PENDING:
+                self.state = LOADING
+                self._started_at = time.perf_counter()
+                threading.Thread(target=self._run, name=f"warmup-{self.name}", daemon=True).start()
+        return self
+
+    def _run(self):
+        try:
+            self._result = self.factory()
+            self.state = READY
+        except BaseException as e:
+            self.error = e
+            self.state = FAILED
+            print(f"Background loading of {self.name} failed: {e}")
+        finally:
+            self._finished_at = time.perf_counter()
+            self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def status(self) -> Dict:
+        elapsed = None
+        if self._started_at is not None:
+            elapsed = (self._finished_at or time.perf_counter()) - self._started_at
+        return {
+            "name": self.name,
+            "state": self.state,
+            "elapsed_s": None if elapsed is None else round(elapsed, 2),
+            "error": None if self.error is None else str(self.error),
+        }
+
+    def get(self, timeout: Optional[float] = None):
+        """
+        Waits for the object (starting the load if needed). Raises the loading
+        error, or TimeoutError if it is not ready within `timeout` seconds.
+        """
+        self.start()
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"{self.name} is still loading")
+        if self.error is not None:
+            raise self.error
+        return self._result
+
+
+def preload(data_path: str = "data/processed/knowledge_base.csv", models_only: bool = False) -> Dict:
+    """
+    Downloads/loads the models and (unless models_only) builds the retrieval
+    index, so a container starts with warm caches. Returns the time per step.
+    """
+    timings = {}
+    start = time.perf_counter()
+    from src.models import get_classifier, get_summarizer
+    timings["import_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_classifier()
+    timings["classifier_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_summarizer()
+    timings["summarizer_s"] = time.perf_counter() - start
+
+    if not models_only:
+        start = time.perf_counter()
+        from src.generator import FewShotGenerator
+        FewShotGenerator(data_path=data_path)
+        timings["generator_s"] = time.perf_counter() - start
+    return {k: round(v, 2) for k, v in timings.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm the model and index caches (e.g. while building a container).")
+    parser.add_argument("--data", default="data/processed/knowledge_base.csv")
+    parser.add_argument("--models-only", action="store_true", help="Only download/load the models (no knowledge base needed).")
+    args = parser.parse_args()
+
+    for step, seconds in preload(args.data, args.models_only).items():
+        print(f"{step}: {seconds}")
@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import functools
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_CHUNK = 8
+REPORT_PATH = "data/benchmarks/scaling.json"
+# Seconds a starting worker waits for its core set from the parent
+CORE_SET_TIMEOUT_S = 10
+
+# Object the worker runs its method on: set in the parent before forking
+# (inherited copy-on-write) or built by the worker itself under spawn
+_TARGET = None
+_CORES = None
+
+
+def available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_cores(workers: int, cores: List[int] = None) -> List[List[int]]:
+    """
+    Splits the usable cores into `workers` disjoint contiguous sets, e.g.
+    8 cores / 3 workers -> [0, 1, 2], [3, 4, 5], [6, 7]. With more workers than
+    cores the sets wrap around and overlap.
+    """
+    cores = cores or available_cores()
+    if workers > len(cores):
+        print(f"Warning: {workers} workers on {len(cores)} cores, cores will be shared.")
+        return [[cores[i % len(cores)]] for i in range(workers)]
+    size, extra = divmod(len(cores), workers)
+    plan, start = [], 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        plan.append(cores[start:end])
+        start = end
+    return plan
+
+
+def pin_process(cores: List[int]):
+    """
+    Restricts the calling process to `cores` and sizes torch's intra-op pool to match.
+    """
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(len(cores))
+    try:
+        import torch
+        torch.set_num_threads(len(cores))
+    except ImportError:
+        pass
+
+
+def _init_worker(core_sets, factory: Optional[Callable]):
+    global _TARGET, _CORES
+    try:
+        _CORES = core_sets.get(timeout=CORE_SET_TIMEOUT_S)
+    except queue.Empty:
+        print(f"Worker {os.getpid()} found no core set to claim.", file=sys.stderr)
+        raise
+    if _CORES:
+        pin_process(_CORES)
+    if factory is not None:
+        _TARGET = factory()
+    else:
+        # Forked: the inherited caches need their own SQLite connections
+        from src.summary_cache import SummaryCache
+        for value in vars(_TARGET).values():
+            if isinstance(value, SummaryCache):
+                value.reopen()
+
+
+def _run_chunk(method: str, items: List, kwargs: Dict = None) -> Dict:
+    start = time.perf_counter()
+    results = getattr(_TARGET, method)(items, **(kwargs or {}))
+    return {"results": results, "seconds": time.perf_counter() - start, "pid": os.getpid(), "cores": _CORES}
+
+
+def build_generator(**kwargs):
+    from src.generator import FewShotGenerator
+    return FewShotGenerator(**kwargs)
+
+
+def build_engine(**kwargs):
+    from src.analysis import AnalysisEngine
+    return AnalysisEngine(**kwargs)
+
+
+def build_uncached(build: Callable, **kwargs):
+    """
+    build(**kwargs) with its summary cache disabled, as in benchmark.py, so
+    every run of a scaling report does the same amount of model work.
+    """
+    from src.summary_cache import SummaryCache
+    target = build(**kwargs)
+    # max_entries=0 keeps nothing, so every call pays for the summarizer
+    target.summary_cache = SummaryCache(max_entries=0)
+    return target
+
+
+class WorkerPool:
+    """
+    N model-holding worker processes, each pinned to its own set of cores with
+    a matching torch.set_num_threads.
+
+    With the 'fork' start method (default on Linux) the target is built once in
+    the parent and the workers inherit it, so the model weights are shared
+    copy-on-write instead of loaded N times. Under 'spawn' every worker calls
+    `factory` itself, so it must be picklable (e.g. functools.partial of
+    build_generator). The parent should not run inference before the pool
+    starts, since OpenMP thread pools do not survive a fork.
+
+        with WorkerPool(functools.partial(build_generator, data_path=path), "generate_steps_batch", workers=4) as pool:
+            for result in pool.map(queries):
+                ...
+    """
+
+    def __init__(self, factory: Callable, method: str = "generate_steps_batch", workers: int = 2,
+                 cores: List[int] = None, start_method: str = None, max_pending: int = None):
+        self.factory = factory
+        self.method = method
+        self.workers = workers
+        self.core_sets = plan_cores(workers, cores)
+        self.start_method = start_method or ("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+        self.max_pending = max_pending or 2 * workers
+        self.stats = {"chunks": 0, "items": 0, "busy_s": 0.0, "by_worker": {}}
+        # run() is called from several threads (e.g. batch_cli --workers)
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def start(self) -> "WorkerPool":
+        global _TARGET
+        if self._pool is not None:
+            return self
+        context = multiprocessing.get_context(self.start_method)
+        core_queue = context.Queue()
+        for cores in self.core_sets:
+            core_queue.put(cores)
+        factory = self.factory
+        if self.start_method == "fork":
+            _TARGET = self.factory()
+            factory = None
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                         initializer=_init_worker, initargs=(core_queue, factory))
+        return self
+
+    def close(self):
+        global _TARGET
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        _TARGET = None
+
+    def __enter__(self) -> "WorkerPool":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def warm_up(self, item):
+        """
+        Submits one item per worker so later timings exclude process startup.
+        The executor does not route tasks, so a fast worker may take two of
+        them and another none: every worker has loaded its target (that
+        happens in the initializer), but not every worker is guaranteed to
+        have run a call.
+        """
+        self.start()
+        futures = [self._pool.submit(_run_chunk, self.method, [item]) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def _record(self, chunk: Dict):
+        with self._lock:
+            self.stats["chunks"] += 1
+            self.stats["items"] += len(chunk["results"])
+            self.stats["busy_s"] += chunk["seconds"]
+            self.stats["by_worker"][chunk["pid"]] = self.stats["by_worker"].get(chunk["pid"], 0) + len(chunk["results"])
+
+    def snapshot(self) -> Dict:
+        """
+        Consistent copy of `stats` while other threads may be recording.
+        """
+        with self._lock:
+            return {**self.stats, "by_worker": dict(self.stats["by_worker"])}
+
+    def run(self, items: List, **kwargs) -> List:
+        """
+        Runs one chunk on the next free worker and waits for its results.
+        """
+        self.start()
+        done = self._pool.submit(_run_chunk, self.method, items, kwargs).result()
+        self._record(done)
+        return done["results"]
+
+    def map(self, items: Iterable, chunk_size: int = DEFAULT_CHUNK) -> Iterator:
+        """
+        Yields the method's result for every item, in input order. Items are
+        sent in chunks and at most `max_pending` chunks are in flight, so the
+        input is consumed only as fast as the workers keep up.
+        """
+        self.start()
+        items = iter(items)
+        pending = deque()
+        while True:
+            while len(pending) < self.max_pending:
+                chunk = list(islice(items, chunk_size))
+                if not chunk:
+                    break
+                pending.append(self._pool.submit(_run_chunk, self.method, chunk))
+            if not pending:
+                return
+            done = pending.popleft().result()
+            self._record(done)
+            yield from done["results"]
+
+
+def scaling_report(factory: Callable, method: str, items: List, worker_counts: List[int],
+                   chunk_size: int = DEFAULT_CHUNK, start_method: str = None) -> Dict:
+    """
+    Throughput of the same workload for each worker count (after warm-up),
+    with speedup and parallel efficiency relative to the first count.
+    """
+    rows = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        with WorkerPool(factory, method, workers, start_method=start_method) as pool:
+            pool.warm_up(items[0])
+            startup = time.perf_counter() - start
+            start = time.perf_counter()
+            count = sum(1 for _ in pool.map(items, chunk_size))
+            elapsed = time.perf_counter() - start
+            rows.append({
+                "workers": workers,
+                "threads_per_worker": [len(cores) for cores in pool.core_sets],
+                "startup_s": round(startup, 2),
+                "seconds": round(elapsed, 3),
+                "items_per_s": round(count / elapsed, 2) if elapsed else None,
+                "worker_utilization": round(pool.snapshot()["busy_s"] / (elapsed * workers), 3) if elapsed else None,
+            })
+        print(f"{workers} workers: {rows[-1]['items_per_s']} items/s (startup {rows[-1]['startup_s']}s)")
+
+    base = rows[0]
+    for row in rows:
+        if base["items_per_s"] and row["items_per_s"]:
+            row["speedup"] = round(row["items_per_s"] / base["items_per_s"], 2)
+            row["efficiency"] = round(row["speedup"] * base["workers"] / row["workers"], 2)
+    return {"method": method, "items": len(items), "chunk_size": chunk_size, "cores": len(available_cores()),
+            "rows": rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of the worker pool for a range of worker counts.")
+    parser.add_argument("--target", choices=["generate", "analysis"], default="generate",
+                        help="FewShotGenerator.generate_steps_batch or AnalysisEngine.analyze_local_batch.")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="Worker counts to try (default: 1, 2, 4, ... up to the core count).")
+    parser.add_argument("--items", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK)
+    parser.add_argument("--data", default="data/processed/knowledge_base.csv")
+    parser.add_argument("--start-method", choices=["fork", "spawn", "forkserver"], default=None)
+    parser.add_argument("--output", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    worker_counts = args.workers
+    if not worker_counts:
+        cores = len(available_cores())
+        worker_counts = [n for n in (1, 2, 4, 8, 16, 32, 64) if n <= cores] or [1]
+        if cores not in worker_counts:
+            worker_counts.append(cores)
+
+    if args.target == "generate":
+        from src.benchmark import synthetic_queries
+        factory = functools.partial(build_uncached, build_generator, data_path=args.data, persist_summaries=False)
+        method, items = "generate_steps_batch", synthetic_queries(args.items)
+    else:
+        from src.knowledge_base import load_knowledge_base
+        df = load_knowledge_base(args.data, columns=["full_transcript"])
+        factory = functools.partial(build_uncached, build_engine, gpt_cache_path=None)
+        method = "analyze_local_batch"
+        items = df["full_transcript"].fillna("").head(args.items).tolist()
+
+    report = scaling_report(factory, method, items, worker_counts, args.chunk_size, args.start_method)
+    from src.benchmark import environment
+    report["environment"] = environment()
+
+    print(f"\n{'workers':>8} {'items/s':>9} {'speedup':>8} {'efficiency':>10} {'utilization':>11}")
+    for row in report["rows"]:
+        print(f"{row['workers']:>8} {row['items_per_s']:>9} {row.get('speedup', '-'):>8} "
+              f"{row.get('efficiency', '-'):>10} {row['worker_utilization']:>11}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to {args.output}", file=sys.stderr)